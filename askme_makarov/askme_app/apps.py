@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AskmeAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'askme_app'
+
+    def ready(self):
+        # Registers the system checks.
+        from askme_app import checks  # noqa: F401
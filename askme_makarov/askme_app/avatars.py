@@ -0,0 +1,89 @@
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import router
+from PIL import Image, ImageOps
+
+from askme_app.jobs import task
+
+# CSS size of each place an avatar is shown; thumbnails are made for 1x and 2x screens.
+SIZES = {'small': 60, 'medium': 100, 'large': 150}
+DENSITIES = (1, 2)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# Part of the hash, so that changing sizes or encoders produces new file names instead of
+# overwriting files that browsers have cached forever.
+PIPELINE_VERSION = b'avatars-1'
+
+
+def pixel_sizes():
+    return sorted({size * density for size in SIZES.values() for density in DENSITIES}, reverse=True)
+
+
+def thumbnail_name(avatar_hash, pixels, extension):
+    return f'avatars/{avatar_hash[:2]}/{avatar_hash}-{pixels}.{extension}'
+
+
+def thumbnail_url(avatar_hash, pixels, extension):
+    return default_storage.url(thumbnail_name(avatar_hash, pixels, extension))
+
+
+def content_hash(data):
+    return hashlib.sha256(PIPELINE_VERSION + data).hexdigest()[:32]
+
+
+def make_thumbnails(data):
+    """Decodes the image once and returns {(pixels, extension): encoded bytes} for every thumbnail."""
+    largest = pixel_sizes()[0]
+    image = Image.open(io.BytesIO(data))
+    # JPEG can decode directly at 1/2, 1/4 or 1/8 scale, which is most of the work for a big photo.
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image)
+    image = ImageOps.fit(image.convert('RGB'), (largest, largest), Image.LANCZOS)
+
+    thumbnails = {}
+    for pixels in pixel_sizes():
+        resized = image if pixels == largest else image.resize((pixels, pixels), Image.LANCZOS)
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            thumbnails[(pixels, extension)] = buffer.getvalue()
+    return thumbnails
+
+
+@task(max_attempts=3)
+def process(profile_id):
+    from askme_app.models import Profile
+
+    # Runs right after the upload was committed: a replica may not have it yet.
+    profiles = Profile.manager.db_manager(router.db_for_write(Profile))
+    original = profiles.filter(pk=profile_id).values_list('avatar', flat=True).first()
+    if not original:
+        return None
+    with default_storage.open(original) as f:
+        data = f.read()
+    avatar_hash = content_hash(data)
+    # The same picture uploaded twice (or by two users) is only processed once. The smallest
+    # thumbnail is written last, so it exists only when all of them do.
+    if not default_storage.exists(thumbnail_name(avatar_hash, pixel_sizes()[-1], 'jpg')):
+        for (pixels, extension), content in make_thumbnails(data).items():
+            name = thumbnail_name(avatar_hash, pixels, extension)
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(content))
+    # Skipped if another upload replaced the original in the meantime; its own task sets the hash.
+    profiles.filter(pk=profile_id, avatar=original).update(avatar_hash=avatar_hash)
+    return avatar_hash
+
+
+def schedule(profile_id):
+    # Decoding and resizing a large photo takes far longer than the rest of the request, so the
+    # request only stores the original and queues the thumbnails for run_worker.
+    process.delay(profile_id)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Warning, register
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    # Throttle buckets, page cache versions and the sidebar only work if every worker process sees
+    # the same ones.
+    if 'shared' not in settings.CACHES:
+        return [Error("CACHES has no 'shared' alias", hint="The throttle, the page cache and the sidebar store their state in it.",
+                      id='askme_app.E001')]
+    if isinstance(caches['shared'], LocMemCache):
+        # Fine for runserver, which is a single process.
+        level = Warning if settings.DEBUG else Error
+        return [level(
+            "CACHES['shared'] is a LocMemCache, which every process keeps for itself",
+            hint="With several worker processes the throttle would let through that many times THROTTLE_BUCKETS "
+                 "and a write would only invalidate the cached pages of its own process. "
+                 "Use the file based, database or Redis cache.",
+            id='askme_app.E001',
+        )]
+    return []
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from askme_app import sidebar
+
+
+def leaderboard(request):
+    data = SimpleLazyObject(sidebar.get_leaderboard)
+    return {
+        'tags': SimpleLazyObject(lambda: data['tags']),
+        'users': SimpleLazyObject(lambda: data['users']),
+    }
@@ -0,0 +1,91 @@
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+
+from askme_app.models import Profile, Question, Tag, Comment, QuestionLike, CommentLike
+
+# (record type, model, {foreign key column: record type it points to}), in dependency order.
+# Only types that other records point to need their ids remapped on import.
+SECTIONS = [
+    ('user', User, {}),
+    ('profile', Profile, {'user_id': 'user'}),
+    ('tag', Tag, {}),
+    ('question', Question, {'author_id': 'profile'}),
+    ('question_tag', Question.tags.through, {'question_id': 'question', 'tag_id': 'tag'}),
+    ('comment', Comment, {'author_id': 'profile', 'question_id': 'question'}),
+    ('question_like', QuestionLike, {'author_id': 'profile', 'question_id': 'question'}),
+    ('comment_like', CommentLike, {'author_id': 'profile', 'comment_id': 'comment'}),
+]
+REFERENCED = {record_type for _, _, foreign_keys in SECTIONS for record_type in foreign_keys.values()}
+
+
+def column_names(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+class IdMap:
+    """
+    Old id -> new id for one record type. Records are exported in primary key order and bulk_create
+    returns ids in insertion order, so two sorted int arrays and a bisect are enough: 16 bytes per row
+    instead of a dict entry.
+    """
+
+    def __init__(self):
+        self.old = array('q')
+        self.new = array('q')
+
+    def add(self, old_id, new_id):
+        if self.old and old_id <= self.old[-1]:
+            raise ValueError(f"Records must be in increasing id order, got {old_id} after {self.old[-1]}")
+        self.old.append(old_id)
+        self.new.append(new_id)
+
+    def __getitem__(self, old_id):
+        position = bisect_left(self.old, old_id)
+        if position == len(self.old) or self.old[position] != old_id:
+            raise KeyError(old_id)
+        return self.new[position]
+
+
+class Progress:
+    def __init__(self, stream=sys.stderr, every=2.0):
+        self.stream = stream
+        self.every = every
+        self.started = self.reported = time.monotonic()
+        self.counts = {}
+
+    def tick(self, record_type, n=1):
+        self.counts[record_type] = self.counts.get(record_type, 0) + n
+        now = time.monotonic()
+        if now - self.reported >= self.every:
+            self.reported = now
+            self.stream.write(f"  {record_type}: {self.counts[record_type]} records, {self.rate():.0f} records/s\n")
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def rate(self):
+        return self.total() / max(time.monotonic() - self.started, 1e-9)
+
+    def summary(self):
+        parts = ', '.join(f"{count} {record_type}" for record_type, count in self.counts.items())
+        return f"{parts} in {time.monotonic() - self.started:.1f} s ({self.rate():.0f} records/s)"
+
+
+@contextmanager
+def original_dates(models):
+    # auto_now fields would overwrite the imported timestamps with the import time.
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
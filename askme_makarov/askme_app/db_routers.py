@@ -0,0 +1,90 @@
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# True while reads must see the primary: the request wrote something, or its client wrote
+# something a moment ago (see PinToPrimaryMiddleware).
+_pinned = contextvars.ContextVar('db_pinned', default=False)
+_wrote = contextvars.ContextVar('db_wrote', default=False)
+
+PIN_COOKIE = 'db_pin'
+
+
+def pin():
+    _pinned.set(True)
+    _wrote.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def _replicas():
+    return [alias for alias in getattr(settings, 'REPLICA_DATABASES', []) if alias in settings.DATABASES]
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary (default). Reads go to a random replica, except when they have to see
+    writes the replica may not have replayed yet: after a write in the same request or by the same
+    client within REPLICA_PIN_SECONDS, and inside a transaction on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if not replicas or is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every database holds the same data.
+        return True
+
+
+class PinToPrimaryMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self.start(request)
+        try:
+            return self.finish(self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context into its thread and back, so pin() calls made by the ORM
+        # there are seen here.
+        tokens = self.start(request)
+        try:
+            return self.finish(await self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    def start(self, request):
+        return _pinned.set(PIN_COOKIE in request.COOKIES), _wrote.set(False)
+
+    def finish(self, response):
+        if _wrote.get():
+            response.set_cookie(PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                                httponly=True, samesite='Lax')
+        return response
+
+    def reset(self, tokens):
+        pinned_token, wrote_token = tokens
+        _pinned.reset(pinned_token)
+        _wrote.reset(wrote_token)
@@ -1,10 +1,15 @@
 from django import forms
 from django.contrib import auth
-from django.contrib.auth import login
+from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
 
-from askme_app.models import Profile, Question, Tag, Comment
+from askme_app import avatars
+from askme_app.middleware import forget_profile
+from askme_app.models import Profile, ProfileStats, Question, Tag, Comment, hot_score, index_question
+from askme_app.tag_index import tag_index
 
 
 class LoginForm(forms.Form):
@@ -13,14 +18,20 @@ class LoginForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         self.request = kwargs.pop('request', None)
+        self.user = None
         super(LoginForm, self).__init__(*args, **kwargs)
 
     def clean(self):
         super().clean()
-        user = auth.authenticate(request=self.request, **self.cleaned_data)
-        if user is None:
+        # Password hashing is most of the cost of a login, so the view logs in the user found here
+        # instead of authenticating a second time.
+        self.user = auth.authenticate(request=self.request, **self.cleaned_data)
+        if self.user is None:
             raise ValidationError({'password': 'Wrong password or username'})
 
+    def get_user(self):
+        return self.user
+
 
 class RegisterForm(forms.ModelForm):
     username = forms.CharField()
@@ -54,6 +65,8 @@ class RegisterForm(forms.ModelForm):
         if not profile:
             self.add_error(None,"Profile saving error!")
             return None
+        if avatar:
+            avatars.schedule(profile.pk)
 
         return user
 
@@ -77,10 +90,8 @@ class SettingsForm(forms.Form):
         return password_for_checking
 
     def clean_password(self):
-        username = self.cleaned_data['username']
         password = self.cleaned_data['password']
-        user = auth.authenticate(request=self.request, username=username, password=password)
-        if user is None:
+        if not self.request.user.check_password(password):
             raise ValidationError("The old password is incorrect!")
         return password
 
@@ -104,20 +115,21 @@ class SettingsForm(forms.Form):
             self.add_error(field=None, error="User updating error!")
             return None
 
-        profile = Profile.manager.filter(user_id=user_tmp.id).update(avatar=avatar)
-        if not profile:
-            self.add_error(field=None, error="Profile updating error!")
-            return None
+        if avatar:
+            profile = Profile.manager.get_session_profile(user_tmp.id)
+            if not profile:
+                self.add_error(field=None, error="Profile updating error!")
+                return None
+            profile.avatar = avatar
+            profile.save(update_fields=['avatar'])
+            forget_profile(self.request)
+            avatars.schedule(profile.pk)
 
         if new_password != '':
             user_tmp.set_password(new_password)
             user_tmp.save()
-
-            test_auth_user = auth.authenticate(request=self.request, username=username, password=new_password)
-            if test_auth_user is not None:
-                login(self.request, test_auth_user)
-            else:
-                self.add_error(field=None, error="User authenticating error!")
+            # Keeps this session logged in without hashing the new password a second time.
+            update_session_auth_hash(self.request, user_tmp)
 
         return user_tmp
 
@@ -145,19 +157,18 @@ class AskForm(forms.ModelForm):
 
     def save(self):
         title, content, tags = self.cleaned_data['title'], self.cleaned_data['content'], self.cleaned_data['tags']
-        new_question = Question(title=title, content=content, author=self.profile_id)
-        new_question.save()
-
-        if not new_question:
-            self.add_error(field=None, error="Question saving error!")
-            return None
         splitted_tags = [x.strip() for x in tags.split(',')]
-        for tag in splitted_tags:
-            some_tag = Tag.manager.update_or_create(name=tag)[0]
-            if not some_tag:
-                self.add_error(field=None, error="Tag saving error!")
-                return None
-            new_question.tags.add(some_tag)
+        # The question, its tags and its search indexing job are committed together.
+        with transaction.atomic():
+            new_question = Question(title=title, content=content, author=self.profile_id,
+                                    hot_score=hot_score(0, 0, timezone.now()))
+            new_question.save()
+            ProfileStats.manager.bump(new_question.author_id, questions_count=1)
+            # get_or_create: an existing tag needs no write, unlike update_or_create.
+            new_question.tags.add(*[Tag.manager.get_or_create(name=tag)[0] for tag in splitted_tags])
+            Question.manager.touch(new_question.pk)
+            index_question.delay(new_question.pk)
+        tag_index.add(splitted_tags)
 
         return new_question
 
@@ -174,7 +185,7 @@ class CommentForm(forms.ModelForm):
 
     def save(self):
         content = self.cleaned_data['content']
-        comment = Comment.manager.create(content=content, author=self.profile, question=self.question)
+        comment = Comment.manager.create_comment(content=content, author=self.profile, question=self.question)
         if not comment:
             self.add_error(field=None, error="Comment saving error!")
             return None
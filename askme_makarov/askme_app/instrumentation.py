@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.sql.compiler import SQLCompiler
+
+# Label of the manager method that is running right now, for queries it executes itself.
+_current_label = contextvars.ContextVar('instrument_label', default=None)
+# QueryRecorder of the request being served (see recording()).
+_current_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+_EXECUTE_SQL = SQLCompiler.execute_sql.__code__
+# Frames between the execute wrapper and SQLCompiler.execute_sql are Django's cursor wrappers.
+_MAX_DEPTH = 13
+
+
+def instrumented(method):
+    """
+    Attributes the queries of a manager method to "Manager.method". Querysets are lazy and usually
+    run in the view or the template, so a returned queryset carries the label on its Query, which
+    survives filter(), order_by() and slicing; queries run during the call use a context variable.
+    """
+    label = method.__qualname__
+
+    def tag(result):
+        if isinstance(result, QuerySet) and getattr(result.query, 'instrument_label', None) is None:
+            result.query.instrument_label = label
+        return result
+
+    if asyncio.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            token = _current_label.set(label)
+            try:
+                return tag(await method(*args, **kwargs))
+            finally:
+                _current_label.reset(token)
+
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _current_label.set(label)
+        try:
+            return tag(method(*args, **kwargs))
+        finally:
+            _current_label.reset(token)
+
+    return wrapper
+
+
+def _query_label():
+    frame = sys._getframe(2)
+    for _ in range(_MAX_DEPTH):
+        if frame is None:
+            break
+        if frame.f_code is _EXECUTE_SQL:
+            label = getattr(frame.f_locals['self'].query, 'instrument_label', None)
+            if label is not None:
+                return label
+            break
+        frame = frame.f_back
+    return _current_label.get() or 'other'
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times the queries of one request by label and SQL text."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.by_label = defaultdict(lambda: [0, 0.0])
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        label = _query_label()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            stats = self.by_label[label]
+            stats[0] += 1
+            stats[1] += elapsed
+            self.statements[(label, sql)] += 1
+
+    def duplicates(self, threshold=1):
+        # Same SQL (parameters aside) run more than threshold times: the usual shape of an N+1.
+        return {key: n for key, n in self.statements.items() if n > threshold}
+
+
+def _record(execute, sql, params, many, context):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _install_recorder(sender, connection, **kwargs):
+    # On every connection once, rather than per request with connection.execute_wrapper(): under
+    # ASGI the connections belong to the thread the ORM runs in, not to the event loop.
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+connection_created.connect(_install_recorder, dispatch_uid='askme_app.instrumentation')
+
+
+@contextmanager
+def recording(recorder):
+    """Sends the queries run in this context, on any connection and in sync_to_async threads, to recorder."""
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
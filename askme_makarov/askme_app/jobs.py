@@ -0,0 +1,169 @@
+import importlib
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connections
+
+logger = logging.getLogger('askme_app.jobs')
+
+# Work that does not have to happen before the response (thumbnails, search indexing) is stored as a
+# row of the jobs table (models.Job) in the same transaction as the write it belongs to, and run by
+# "manage.py run_worker". No broker: the database the site already uses is the queue.
+
+_registry = {}
+
+
+def task(max_attempts=5):
+    """
+    Registers a function as a task: ``func.delay(*args)`` queues a call with JSON serializable
+    arguments, ``func(*args)`` still runs it right away. Failed attempts are retried with
+    exponential backoff up to max_attempts.
+    """
+
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _registry[name] = func
+
+        @wraps(func)
+        def delay(*args):
+            from askme_app.models import Job
+
+            return Job.manager.enqueue(name, args, max_attempts=max_attempts)
+
+        func.task_name = name
+        func.delay = delay
+        return func
+
+    return decorator
+
+
+def get_task(name):
+    if name not in _registry:
+        # The worker may not have imported the module that defines the task yet.
+        module, _, _ = name.rpartition('.')
+        importlib.import_module(module)
+    return _registry[name]
+
+
+def backoff(attempts):
+    # 5 s, 10 s, 20 s... with jitter so that jobs failing together do not retry together.
+    base = getattr(settings, 'JOB_RETRY_BASE', 5)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX', 3600))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _record(update, attempts=8):
+    # The task has already run: a write error here (SQLite answers "database is locked" while another
+    # worker writes) must not leave the job running, or requeue_stale() would run it a second time.
+    for attempt in range(attempts):
+        try:
+            return update()
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.01 * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def execute(job):
+    from askme_app.models import Job
+
+    try:
+        get_task(job.task)(*job.args)
+    except Exception:
+        error = traceback.format_exc()
+        retry = job.attempts < job.max_attempts
+        logger.warning("Job %s (%s) failed on attempt %d%s", job.pk, job.task, job.attempts,
+                       ', will retry' if retry else ', giving up', exc_info=True)
+        delay = backoff(job.attempts) if retry else None
+        _record(lambda: Job.manager.retry_or_fail(job, error, delay))
+        return False
+    _record(lambda: Job.manager.finish(job))
+    return True
+
+
+class Worker:
+    """
+    Runs jobs in `concurrency` threads. Each thread claims one job at a time and polls every
+    JOB_POLL_INTERVAL seconds while the queue is empty. With burst=True the threads exit as soon
+    as there is nothing left to claim.
+    """
+
+    def __init__(self, concurrency=1, burst=False):
+        self.concurrency = concurrency
+        self.burst = burst
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self):
+        threads = [threading.Thread(target=self.loop, args=(f'{self.name}:{i}',), name=f'worker-{i}')
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        maintenance_period = getattr(settings, 'JOB_TIMEOUT', 600) / 10
+        next_maintenance = 0
+        try:
+            while any(thread.is_alive() for thread in threads):
+                if time.monotonic() >= next_maintenance:
+                    self.maintain()
+                    next_maintenance = time.monotonic() + maintenance_period
+                self.stopping.wait(1)
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            connections.close_all()
+
+    def maintain(self):
+        from askme_app.models import Job
+
+        try:
+            requeued, failed = Job.manager.requeue_stale(getattr(settings, 'JOB_TIMEOUT', 600))
+            if requeued or failed:
+                logger.warning("Requeued %d and failed %d jobs of dead workers", requeued, failed)
+            Job.manager.purge(getattr(settings, 'JOB_RETENTION', 86400))
+        except Exception:
+            logger.exception("Queue maintenance failed")
+        finally:
+            close_old_connections()
+
+    def loop(self, name):
+        from askme_app.models import Job
+
+        interval = getattr(settings, 'JOB_POLL_INTERVAL', 1)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    job = Job.manager.claim(name)
+                    if job is not None:
+                        succeeded = execute(job)
+                except Exception:
+                    # Typically the database going away or, on SQLite, locked by another writer. A
+                    # job claimed before the error is queued again by maintain().
+                    logger.exception("Worker %s could not run a job", name)
+                    close_old_connections()
+                    self.stopping.wait(interval)
+                    continue
+                close_old_connections()
+                if job is None:
+                    if self.burst:
+                        return
+                    self.stopping.wait(interval * random.uniform(0.5, 1.5))
+                    continue
+                with self._lock:
+                    self.processed += 1
+                    self.failed += not succeeded
+        finally:
+            connections.close_all()
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+
+def question_channel(question_id):
+    return f'question:{question_id}'
+
+
+class InProcessBroker:
+    """
+    Pub/sub inside one ASGI process. Every subscriber is an asyncio queue that belongs to the event
+    loop serving its connection, so an idle client costs a queue and a suspended coroutine, not a
+    thread. Publishers are usually sync views running in worker threads: they hand each message to
+    the subscriber's loop with call_soon_threadsafe.
+
+    Another broker (e.g. Redis or PostgreSQL LISTEN/NOTIFY, for several processes) only needs the
+    same subscribe / unsubscribe / publish methods and the LIVE_BROKER setting pointing at it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, channel):
+        queue = asyncio.Queue(maxsize=getattr(settings, 'LIVE_QUEUE_SIZE', 100))
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self.lock:
+            subscribers = self.subscribers.get(channel, set())
+            subscribers.difference_update([item for item in subscribers if item[1] is queue])
+            if not subscribers:
+                self.subscribers.pop(channel, None)
+
+    def publish(self, channel, message):
+        with self.lock:
+            targets = list(self.subscribers.get(channel, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # The loop has been closed, its connections are gone.
+                pass
+
+    @staticmethod
+    def _deliver(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A client that stopped reading misses updates instead of growing memory without bound.
+            pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'LIVE_BROKER', 'askme_app.live.InProcessBroker'))()
+    return _broker
+
+
+def publish_on_commit(question_id, event, data):
+    # Clients must never see an answer or a like that is rolled back afterwards.
+    message = {'event': event, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(question_channel(question_id), message))
+
+
+def answer_added(comment):
+    publish_on_commit(comment.question_id, 'answer', {
+        'url': reverse('like_comment', kwargs={'comment_id': comment.pk}),
+        'html': render_to_string('components/comment-item.html', {'comment': comment}),
+    })
+
+
+def question_likes_changed(question_id, likes_count):
+    url = reverse('like_question', kwargs={'question_id': question_id})
+    publish_on_commit(question_id, 'likes', {'url': url, 'likes_count': likes_count})
+
+
+def comment_likes_changed(comment_id, question_id, likes_count):
+    url = reverse('like_comment', kwargs={'comment_id': comment_id})
+    publish_on_commit(question_id, 'likes', {'url': url, 'likes_count': likes_count})
+
+
+def format_event(message):
+    return f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+async def event_stream(question_id):
+    """
+    Server-sent events for one question. Django cannot tell that a client went away until a write
+    fails, so the stream sends a comment line every LIVE_HEARTBEAT seconds and ends after
+    LIVE_STREAM_MAX_AGE seconds; EventSource reconnects by itself.
+    """
+    broker = get_broker()
+    channel = question_channel(question_id)
+    queue = broker.subscribe(channel)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, 'LIVE_STREAM_MAX_AGE', 300)
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT', 15)
+    try:
+        yield 'retry: 3000\n\n'
+        while loop.time() < deadline:
+            try:
+                message = await asyncio.wait_for(queue.get(), min(heartbeat, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield format_event(message)
+    finally:
+        broker.unsubscribe(channel, queue)
@@ -0,0 +1,165 @@
+import json
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from askme_app import sidebar
+from askme_app.management.commands.bench_asgi import percentile
+from askme_app.models import Question, Comment, Tag
+
+# POST-only endpoints, the endless event stream and logout (it would end the logged-in run).
+SKIPPED = {'question_events', 'like_question', 'like_comment', 'logout'}
+
+
+class Command(BaseCommand):
+    help = ("Drives every GET page in urls.py with concurrent clients and reports latency percentiles, "
+            "requests/s and SQL queries per request. Results can be saved as JSON and compared.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ratio", type=int, default=None,
+                            help="Seed with fill_db RATIO first; without it the current data is used")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per page")
+        parser.add_argument("--concurrency", type=int, default=8, help="Client threads per page")
+        parser.add_argument("--user", default=None, help="Log the clients in as this user")
+        parser.add_argument("--bypass-page-cache", action="store_true",
+                            help="Give every request a unique query string so anonymous pages are rendered")
+        parser.add_argument("--only", action="append", default=None, help="URL name to run, can be repeated")
+        parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+        parser.add_argument("--compare", default=None, help="JSON file of an earlier run to compare against")
+
+    def sample_urls(self):
+        question = Question.manager.order_by('-answers_count').first()
+        tag = Tag.manager.order_by('id').first()
+        if question is None or tag is None:
+            raise CommandError("The database is empty, run with --ratio or fill_db first")
+        kwargs = {'question_id': question.id, 'tag_name': tag.name,
+                  'comment_id': Comment.manager.filter(question=question).values_list('id', flat=True).first()}
+        extra = {'search': '?q=' + question.title.split()[0], 'tag_autocomplete': '?term=' + tag.name[:2]}
+
+        urls = {}
+        for pattern in get_resolver().url_patterns:
+            if not isinstance(pattern, URLPattern) or not pattern.name or pattern.name in SKIPPED:
+                continue
+            params = {name: kwargs[name] for name in pattern.pattern.converters}
+            urls[pattern.name] = reverse(pattern.name, kwargs=params) + extra.get(pattern.name, '')
+        return urls
+
+    def run(self, url, requests, concurrency, user, bypass):
+        latencies, queries, statuses = [], [], []
+        local = threading.local()
+
+        def count(execute, sql, params, many, context):
+            local.queries += 1
+            return execute(sql, params, many, context)
+
+        def fetch(i):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                if user is not None:
+                    local.client.force_login(user)
+            separator = '&' if '?' in url else '?'
+            local.queries = 0
+            start = time.perf_counter()
+            # Reads go to the replicas, so every alias is counted.
+            with ExitStack() as stack:
+                for alias_connection in connections.all():
+                    stack.enter_context(alias_connection.execute_wrapper(count))
+                response = local.client.get(f"{url}{separator}bench={i}" if bypass else url)
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(local.queries)
+            statuses.append(response.status_code)
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(fetch, range(requests)))
+            elapsed = time.perf_counter() - start
+        return {
+            'url': url,
+            'requests': requests,
+            'rps': round(requests / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, results, path):
+        with open(path) as f:
+            previous = json.load(f)['views']
+        self.stdout.write(f"\nCompared with {path}:")
+        for name, current in results.items():
+            if name not in previous:
+                continue
+            changes = []
+            for metric in ('rps', 'p50_ms', 'p95_ms', 'queries_per_request'):
+                before, after = previous[name][metric], current[metric]
+                change = f"{(after - before) / before:+.0%}" if before else "n/a"
+                changes.append(f"{metric} {before} -> {after} ({change})")
+            self.stdout.write(f"{name:>18}: " + ', '.join(changes))
+
+    def handle(self, *args, **kwargs):
+        if kwargs['ratio'] is not None:
+            call_command('fill_db', kwargs['ratio'], stdout=self.stdout)
+        user = None
+        if kwargs['user'] is not None:
+            user = User.objects.filter(username=kwargs['user']).first()
+            if user is None:
+                raise CommandError(f"No user {kwargs['user']}")
+
+        urls = self.sample_urls()
+        if kwargs['only']:
+            urls = {name: url for name, url in urls.items() if name in kwargs['only']}
+        sidebar.refresh()
+
+        results = {}
+        # The test client sends Host: testserver, which ALLOWED_HOSTS would answer with 400.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, url in urls.items():
+                results[name] = self.run(url, kwargs['requests'], kwargs['concurrency'], user,
+                                         kwargs['bypass_page_cache'])
+                result = results[name]
+                self.stdout.write(
+                    f"{name:>18}: {result['rps']:7.1f} req/s, p50 {result['p50_ms']:.1f} ms, "
+                    f"p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms, "
+                    f"{result['queries_per_request']:.1f} queries, statuses {result['statuses']}"
+                )
+
+        if kwargs['output']:
+            report = {
+                'meta': {
+                    'commit': self.git_commit(),
+                    'date': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'questions': Question.manager.count(),
+                    'ratio': kwargs['ratio'],
+                    'requests': kwargs['requests'],
+                    'concurrency': kwargs['concurrency'],
+                    'user': kwargs['user'],
+                    'bypass_page_cache': kwargs['bypass_page_cache'],
+                },
+                'views': results,
+            }
+            with open(kwargs['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {kwargs['output']}")
+        if kwargs['compare']:
+            self.compare(results, kwargs['compare'])
@@ -0,0 +1,92 @@
+import asyncio
+import importlib
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches
+
+from askme_app import sidebar
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = ("Compares one worker serving concurrent requests to the read pages: the sync views behind "
+            "a pool of WSGI threads against the async views on one ASGI event loop.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=['/', '/hot'])
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=50,
+                            help="Requests in flight at once")
+        parser.add_argument("--threads", type=int, default=8,
+                            help="Threads of the WSGI worker")
+
+    def urls(self, n, paths):
+        # A unique query string per request keeps the anonymous page cache out of the measurement.
+        return [f"{paths[i % len(paths)]}?bench={i}" for i in range(n)]
+
+    def reload_urls(self, **overrides):
+        # urls.py picks the views when it is imported.
+        with override_settings(**overrides):
+            importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def run_wsgi(self, urls, threads):
+        latencies, local = [], threading.local()
+
+        def fetch(url):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            start = time.perf_counter()
+            response = local.client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+            return response.status_code
+
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            statuses = list(pool.map(fetch, urls))
+        return time.perf_counter() - start, latencies, statuses
+
+    async def run_asgi(self, urls, concurrency):
+        latencies, client = [], AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*[fetch(url) for url in urls])
+        return time.perf_counter() - start, latencies, statuses
+
+    def report(self, name, elapsed, latencies, statuses):
+        errors = sum(status != 200 for status in statuses)
+        self.stdout.write(
+            f"{name:>24}: {len(latencies) / elapsed:7.1f} req/s, p50 {statistics.median(latencies):.1f} ms, "
+            f"p95 {percentile(latencies, 95):.1f} ms, p99 {percentile(latencies, 99):.1f} ms, {errors} errors"
+        )
+
+    def handle(self, *args, **kwargs):
+        urls = self.urls(kwargs['requests'], kwargs['paths'])
+        sidebar.refresh()
+        self.stdout.write(f"{len(urls)} requests to {', '.join(kwargs['paths'])}, "
+                          f"{kwargs['concurrency']} in flight")
+        try:
+            self.reload_urls(ASYNC_READ_VIEWS=False)
+            self.report(f"WSGI, {kwargs['threads']} threads", *self.run_wsgi(urls, kwargs['threads']))
+            self.reload_urls(ASYNC_READ_VIEWS=True)
+            self.report("ASGI, async views", *asyncio.run(self.run_asgi(urls, kwargs['concurrency'])))
+        finally:
+            self.reload_urls()
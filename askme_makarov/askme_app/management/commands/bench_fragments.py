@@ -0,0 +1,57 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+
+from askme_app.forms import CommentForm
+from askme_app.models import Question, Comment
+from askme_app.paginators import CursorPaginator
+
+
+class Command(BaseCommand):
+    help = ("Compares rendering time of a question page with 30 answers with and without the "
+            "fragment cache. The database is only queried once, before timing.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--question", type=int, default=None,
+                            help="Question id; defaults to one with the most answers")
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def measure(self, render, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), max(timings)
+
+    def handle(self, *args, **kwargs):
+        question_id = kwargs['question']
+        if question_id is None:
+            question_id = Question.manager.order_by('-answers_count').values_list('id', flat=True).first()
+        question = Question.manager.filter(pk=question_id).first()
+        if question is None:
+            raise CommandError("No question to render, seed the database with fill_db first")
+
+        comments = CursorPaginator(Comment.manager.get_comments_ordered_by_likes(question_id), 30).page()
+        request = RequestFactory().get(f'/question/{question_id}')
+        request.user = AnonymousUser()
+        context = {'question': question, 'comments': comments, 'pages': comments,
+                   'question_id': question_id, 'comment_form': CommentForm()}
+        # The sidebar comes from its own cache; render once so that neither run pays for it.
+        render_to_string('question.html', context, request)
+        render = lambda: render_to_string('question.html', context, request)
+
+        self.stdout.write(f"Question {question_id}: {len(comments)} answers on the page, {kwargs['repeat']} runs")
+        with override_settings(FRAGMENT_CACHE_ENABLED=False):
+            median, worst = self.measure(render, kwargs['repeat'])
+        self.stdout.write(f"{'no fragment cache':>20}: median {median:.2f} ms, max {worst:.2f} ms")
+
+        cache.delete_many([f'fragment:comment:{comment.pk}:{comment.fragment_version}' for comment in comments])
+        render()
+        median, worst = self.measure(render, kwargs['repeat'])
+        self.stdout.write(f"{'warm fragment cache':>20}: median {median:.2f} ms, max {worst:.2f} ms")
@@ -0,0 +1,36 @@
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db.models import Count
+
+from askme_app.models import Question
+
+
+class Command(BaseCommand):
+    help = ("Compares /hot page latency of the stored hot score against annotate-and-sort. "
+            "Seed the database first, e.g. fill_db 10000 for 100k questions or fill_db 100000 for 1M.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--per-page", type=int, default=20)
+
+    def measure(self, build_queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(build_queryset())
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), max(timings)
+
+    def handle(self, *args, **kwargs):
+        repeat, per_page = kwargs['repeat'], kwargs['per_page']
+        self.stdout.write(f"{Question.manager.count()} questions, {repeat} runs per query")
+        candidates = {
+            'annotate and sort': lambda: Question.manager.annotate(num_likes=Count('question_likes'))
+            .order_by('-num_likes')[:per_page],
+            'stored hot score': lambda: Question.manager.get_top_questions()[:per_page],
+        }
+        for name, build_queryset in candidates.items():
+            median, worst = self.measure(build_queryset, repeat)
+            self.stdout.write(f"{name:>20}: median {median:.2f} ms, max {worst:.2f} ms")
@@ -0,0 +1,51 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = ("Replays a credential stuffing burst (wrong passwords for many usernames from a few IPs) "
+            "against the login view, with and without the throttle, and reports the CPU it costs.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=300)
+        parser.add_argument("--ips", type=int, default=3, help="Source addresses of the burst")
+        parser.add_argument("--usernames", type=int, default=100, help="Usernames tried")
+
+    def burst(self, run, kwargs):
+        # Every run uses addresses and usernames of its own, so it starts with full buckets. Unknown
+        # usernames cost a hash as well: Django hashes anyway so that timing does not reveal them.
+        usernames = [f'stuffing{run}-{i}' for i in range(kwargs['usernames'])]
+        ips = [f'10.{run}.{i // 256}.{i % 256}' for i in range(kwargs['ips'])]
+        rng = random.Random(run)
+        return [(rng.choice(ips), rng.choice(usernames)) for _ in range(kwargs['requests'])]
+
+    def run(self, name, attempts, enabled):
+        client, url, statuses = Client(), reverse('login'), []
+        # The test client sends Host: testserver, which ALLOWED_HOSTS would answer with 400.
+        with override_settings(THROTTLE_ENABLED=enabled, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            wall, cpu = time.perf_counter(), time.process_time()
+            for ip, username in attempts:
+                response = client.post(url, {'username': username, 'password': 'wrong password'}, REMOTE_ADDR=ip)
+                statuses.append(response.status_code)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        rejected = statuses.count(429)
+        self.stdout.write(
+            f"{name:>14}: {len(statuses)} attempts, {len(statuses) - rejected} hashed, {rejected} rejected with 429, "
+            f"CPU {cpu:.2f} s ({cpu / len(statuses) * 1000:.1f} ms per attempt), wall {wall:.2f} s"
+        )
+        return cpu
+
+    def handle(self, *args, **kwargs):
+        # Django logs a warning for every 429.
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        run = random.randrange(255)
+        off = self.run('no throttle', self.burst(run, kwargs), enabled=False)
+        on = self.run('throttle', self.burst(run + 1, kwargs), enabled=True)
+        if on:
+            self.stdout.write(f"The throttle cut the CPU spent on the burst {off / on:.1f}x")
@@ -0,0 +1,50 @@
+from django.contrib.staticfiles.finders import FileSystemFinder
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import BaseCommand, CommandError, call_command
+
+from askme_app.staticfiles import CompressedManifestStaticFilesStorage
+
+
+def _percent(size, original):
+    return f"{1 - size / original:.0%}" if original else '-'
+
+
+class Command(BaseCommand):
+    help = "Collects static files minified, fingerprinted and precompressed, and reports the bytes saved per asset"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all-apps", action="store_true",
+                            help="List the files of installed apps (admin, fontawesome...) one by one too")
+
+    def handle(self, *args, **kwargs):
+        if not isinstance(staticfiles_storage, CompressedManifestStaticFilesStorage):
+            raise CommandError("STORAGES['staticfiles'] must be askme_app.staticfiles.CompressedManifestStaticFilesStorage")
+        call_command('collectstatic', interactive=False, clear=True, verbosity=0)
+
+        own = {path for path, storage in FileSystemFinder().list([])}
+        report = staticfiles_storage.build_report
+        self.stdout.write(f"{'asset':<48} {'original':>10} {'minified':>10} {'gzip':>10} {'brotli':>10} {'saved':>6}")
+        totals = {'original': 0, 'served': 0}
+        others = {'files': 0, 'original': 0, 'served': 0}
+        for name in sorted(report):
+            sizes = report[name]
+            original = sizes['original']
+            gz, br = sizes.get('.gz'), sizes.get('.br')
+            # What a browser accepting brotli (or else gzip) downloads.
+            served = min(size for size in (sizes['minified'], gz, br) if size is not None)
+            totals['original'] += original
+            totals['served'] += served
+            if name not in own and not kwargs['all_apps']:
+                others['files'] += 1
+                others['original'] += original
+                others['served'] += served
+                continue
+            self.stdout.write(f"{name:<48} {original:>10} {sizes['minified']:>10} {gz or '-':>10} {br or '-':>10} "
+                              f"{_percent(served, original):>6}")
+        if others['files']:
+            self.stdout.write(f"{'(' + str(others['files']) + ' files of installed apps)':<48} {others['original']:>10} "
+                              f"{'':>10} {'':>10} {others['served']:>10} {_percent(others['served'], others['original']):>6}")
+        for name in sorted(staticfiles_storage.missing):
+            self.stderr.write(f"Referenced but missing: {name}")
+        self.stdout.write(f"Total: {totals['original']} -> {totals['served']} bytes "
+                          f"({_percent(totals['served'], totals['original'])} saved) in {staticfiles_storage.location}")
@@ -0,0 +1,35 @@
+import gzip
+import json
+
+from django.core.management import BaseCommand
+
+from askme_app.corpus import SECTIONS, Progress, column_names
+
+
+def encode_value(value):
+    # Unlike DjangoJSONEncoder, keeps the microseconds of datetimes.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class Command(BaseCommand):
+    help = "Streams users, profiles, tags, questions, comments and likes to a gzipped JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **kwargs):
+        encoder = json.JSONEncoder(separators=(',', ':'), default=encode_value)
+        progress = Progress(self.stderr)
+        with gzip.open(kwargs['path'], 'wt', encoding='utf-8') as out:
+            for record_type, model, _ in SECTIONS:
+                columns = column_names(model)
+                rows = model._default_manager.order_by('pk').values_list(*columns) \
+                    .iterator(chunk_size=kwargs['chunk_size'])
+                for row in rows:
+                    out.write(encoder.encode({'type': record_type, 'data': dict(zip(columns, row))}))
+                    out.write('\n')
+                    progress.tick(record_type)
+        self.stdout.write(f"Exported {progress.summary()}")
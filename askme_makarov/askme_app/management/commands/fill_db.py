@@ -1,76 +1,260 @@
-from django.core.management import BaseCommand
+import io
+import random
+from array import array
+from collections import deque
+from datetime import timedelta
+from multiprocessing import Pool
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from askme_app.models import Profile, Question, Tag, QuestionLike, CommentLike, Comment
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
 from faker import Faker
-import random
+
+from askme_app.models import Profile, ProfileStats, Question, Tag, QuestionLike, CommentLike, Comment
 
 fake = Faker()
 
+DATE_RANGE = timedelta(days=2 * 365)
+
+
+# Text generation is the slow part, so it is what runs in the process pool. The workers never
+# touch the database: they return plain tuples and the main process does all the writing.
+
+def fake_users(task):
+    seed, start, count = task
+    fake.seed_instance(seed)
+    # The number after the last underscore keeps names unique even when user_name() ends in digits.
+    return [(f"{fake.user_name()}_{start + i}", fake.email()) for i in range(count)]
+
+
+def fake_questions(task):
+    seed, count = task
+    fake.seed_instance(seed)
+    return [(fake.sentence(nb_words=3)[:64], fake.paragraph()[:255]) for _ in range(count)]
+
+
+def fake_answers(task):
+    seed, count = task
+    fake.seed_instance(seed)
+    return [fake.paragraph()[:255] for _ in range(count)]
+
+
+def chunked(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class Popularity:
+    """
+    Zipf-like skew: every item gets a random rank r and a weight proportional to r ** -s, normalized
+    so that the mean weight is 1. With s = 0 every item has weight 1 (uniform data).
+    """
+
+    def __init__(self, population, s):
+        self.population = max(population, 1)
+        self.s = s
+        self.mean = sum(r ** -s for r in range(1, self.population + 1)) / self.population if s else 1.0
+
+    def weight(self):
+        if not self.s:
+            return 1.0
+        return random.randint(1, self.population) ** -self.s / self.mean
+
+    def count(self, average, limit):
+        # Random rounding keeps the expected total equal to average * population.
+        value = average * self.weight()
+        whole = int(value)
+        if random.random() < value - whole:
+            whole += 1
+        return min(whole, limit)
+
+
+class Chooser:
+    def __init__(self, ids, s):
+        self.ids = ids
+        self.cum_weights = None
+        if s:
+            total, self.cum_weights = 0.0, []
+            for rank in range(1, len(ids) + 1):
+                total += rank ** -s
+                self.cum_weights.append(total)
+
+    def choose(self, k):
+        return random.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+
+class RowWriter:
+    """
+    Writes id-only rows (m2m and like tables) without building model instances:
+    COPY on PostgreSQL, a single executemany INSERT elsewhere.
+    """
+
+    def __init__(self, model, columns):
+        self.table = connection.ops.quote_name(model._meta.db_table)
+        self.columns = ', '.join(connection.ops.quote_name(column) for column in columns)
+        self.placeholders = ', '.join(['%s'] * len(columns))
+        self.written = 0
+
+    def write(self, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                data = io.StringIO(''.join('\t'.join(map(str, row)) + '\n' for row in rows))
+                cursor.copy_expert(f"COPY {self.table} ({self.columns}) FROM STDIN", data)
+            else:
+                cursor.executemany(f"INSERT INTO {self.table} ({self.columns}) VALUES ({self.placeholders})", rows)
+        self.written += len(rows)
+
 
 class Command(BaseCommand):
     help = "Fills database with fake data"
 
     def add_arguments(self, parser):
         parser.add_argument("ratio", type=int)
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Rows generated and written per chunk")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Processes generating text; 1 generates inline")
+        parser.add_argument("--zipf", type=float, default=0.0,
+                            help="Popularity skew exponent for authors, answers and likes (0 is uniform)")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def generate(self, func, tasks):
+        # Keeps at most two chunks per worker in flight, so a slow writer never lets results pile up.
+        if self.pool is None:
+            for task in tasks:
+                yield func(task)
+            return
+        pending = deque()
+        for task in tasks:
+            pending.append(self.pool.apply_async(func, (task,)))
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def random_date(self):
+        return self.now - timedelta(seconds=random.randint(0, int(DATE_RANGE.total_seconds())))
 
     def handle(self, *args, **kwargs):
         ratio = kwargs['ratio']
-        profiles = [
-            Profile(
-                user=User.objects.create(username=fake.unique.user_name(), email=fake.email())
-            ) for _ in range(ratio)
-        ]
-
-        Profile.manager.bulk_create(profiles)
-        profiles = Profile.manager.all()
-        tags = [
-            Tag(
-                name=f"Tag {i}"
-            ) for i in range(ratio)
-        ]
-        Tag.manager.bulk_create(tags)
-        questions = []
-        for _ in range(ratio * 10):
-            author = random.choice(profiles)
-            create_date = fake.date_time()
-            title = fake.sentence(nb_words=3)
-            content = fake.paragraph()
-            question = Question.manager.create(author=author, create_date=create_date, title=title, content=content)
-            question.tags.set(random.sample(tags, random.randint(1, 3)))
-        Question.manager.bulk_create(questions)
-        questions = Question.manager.all()
-        comments = [
-            Comment(
-                author=random.choice(profiles),
-                question=random.choice(questions),
-                create_date=fake.date_time(),
-                content=fake.paragraph(),
-                is_correct=False
-            ) for _ in range(ratio * 100)
-        ]
-        Comment.manager.bulk_create(comments)
-        comments = Comment.manager.all()
-        questions = Question.manager.all()
-        existing_likes = set()
-        desired_likes = ratio * 100
-        likes_to_create = []
-        while len(likes_to_create) < desired_likes:
-            question = random.choice(questions)
-            profile = random.choice(profiles)
-            if (profile.id, question.id) not in existing_likes:
-                like = QuestionLike(author=profile, question=question)
-                likes_to_create.append(like)
-                existing_likes.add((profile.id, question.id))
-        QuestionLike.objects.bulk_create(likes_to_create)
-
-        existing_likes = set()
-        desired_likes = ratio * 100
-        likes_to_create = []
-        while len(likes_to_create) < desired_likes:
-            comment = random.choice(comments)
-            profile = random.choice(profiles)
-            if (profile.id, comment.id) not in existing_likes:
-                like = CommentLike(author=profile, comment=comment)
-                likes_to_create.append(like)
-                existing_likes.add((profile.id, comment.id))
-        CommentLike.objects.bulk_create(likes_to_create)
\ No newline at end of file
+        self.batch_size = kwargs['batch_size']
+        self.workers = kwargs['workers']
+        self.zipf = kwargs['zipf']
+        self.now = timezone.now()
+        seed = kwargs['seed'] if kwargs['seed'] is not None else random.randrange(2 ** 32)
+        random.seed(seed)
+        self.seed = seed
+
+        self.pool = Pool(self.workers) if self.workers > 1 else None
+        try:
+            profile_ids = self.fill_profiles(ratio)
+            tag_ids = self.fill_tags(ratio)
+            question_ids, answers_plan = self.fill_questions(ratio * 10, profile_ids, tag_ids, ratio * 100)
+            self.fill_comments(question_ids, answers_plan, profile_ids, ratio * 100)
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+
+        Question.manager.rebuild_hot_scores(batch_size=self.batch_size)
+        ProfileStats.manager.rebuild(batch_size=self.batch_size)
+        Question.manager.rebuild_search_index()
+
+    def fill_profiles(self, count):
+        password = make_password(None)
+        profile_ids = array('q')
+        # Numbered past the users of earlier runs, so running again (even with the same seed) adds users.
+        offset = User.objects.aggregate(Max('id'))['id__max'] or 0
+        tasks = ((self.seed + start, offset + start, size) for start, size in chunked(count, self.batch_size))
+        for rows in self.generate(fake_users, tasks):
+            with transaction.atomic():
+                users = User.objects.bulk_create(
+                    [User(username=username, email=email, password=password) for username, email in rows]
+                )
+                profiles = Profile.manager.bulk_create([Profile(user=user) for user in users])
+            profile_ids.extend(profile.id for profile in profiles)
+        self.stdout.write(f"Created {len(profile_ids)} profiles")
+        return profile_ids
+
+    def fill_tags(self, count):
+        offset = Tag.manager.count()
+        tag_ids = array('q')
+        for start, size in chunked(count, self.batch_size):
+            tags = Tag.manager.bulk_create([Tag(name=f"Tag {offset + start + i}") for i in range(size)])
+            tag_ids.extend(tag.id for tag in tags)
+        self.stdout.write(f"Created {len(tag_ids)} tags")
+        return tag_ids
+
+    def fill_questions(self, count, profile_ids, tag_ids, likes_total):
+        authors = Chooser(profile_ids, self.zipf)
+        answers_popularity = Popularity(count, self.zipf)
+        likes_popularity = Popularity(count, self.zipf)
+        tag_writer = RowWriter(Question.tags.through, ('question_id', 'tag_id'))
+        like_writer = RowWriter(QuestionLike, ('author_id', 'question_id'))
+
+        question_ids, answers_plan = array('q'), array('l')
+        tasks = ((self.seed + count + start, size) for start, size in chunked(count, self.batch_size))
+        for rows in self.generate(fake_questions, tasks):
+            author_ids = authors.choose(len(rows))
+            questions = []
+            for (title, content), author_id in zip(rows, author_ids):
+                questions.append(Question(
+                    author_id=author_id, create_date=self.random_date(), title=title, content=content,
+                    likes_count=likes_popularity.count(likes_total / count, len(profile_ids)),
+                    answers_count=answers_popularity.count(10, 10 ** 6)
+                ))
+            with transaction.atomic():
+                Question.manager.bulk_create(questions)
+                tag_writer.write([
+                    (question.id, tag_id)
+                    for question in questions
+                    for tag_id in random.sample(tag_ids, min(random.randint(1, 3), len(tag_ids)))
+                ])
+                like_writer.write([
+                    (author_id, question.id)
+                    for question in questions
+                    for author_id in random.sample(profile_ids, question.likes_count)
+                ])
+            question_ids.extend(question.id for question in questions)
+            answers_plan.extend(question.answers_count for question in questions)
+        self.stdout.write(f"Created {len(question_ids)} questions, {tag_writer.written} tag links "
+                          f"and {like_writer.written} question likes")
+        return question_ids, answers_plan
+
+    def fill_comments(self, question_ids, answers_plan, profile_ids, likes_total):
+        authors = Chooser(profile_ids, self.zipf)
+        total = sum(answers_plan)
+        likes_popularity = Popularity(total, self.zipf)
+        like_writer = RowWriter(CommentLike, ('author_id', 'comment_id'))
+
+        def targets():
+            for question_id, answers in zip(question_ids, answers_plan):
+                for _ in range(answers):
+                    yield question_id
+
+        question_of = targets()
+        created = 0
+        tasks = ((self.seed + 2 * total + start, size) for start, size in chunked(total, self.batch_size))
+        for rows in self.generate(fake_answers, tasks):
+            author_ids = authors.choose(len(rows))
+            comments = [
+                Comment(
+                    author_id=author_id, question_id=next(question_of), create_date=self.random_date(),
+                    content=content, is_correct=False,
+                    likes_count=likes_popularity.count(likes_total / max(total, 1), len(profile_ids))
+                ) for content, author_id in zip(rows, author_ids)
+            ]
+            with transaction.atomic():
+                Comment.manager.bulk_create(comments)
+                like_writer.write([
+                    (author_id, comment.id)
+                    for comment in comments
+                    for author_id in random.sample(profile_ids, comment.likes_count)
+                ])
+            created += len(comments)
+        self.stdout.write(f"Created {created} comments and {like_writer.written} comment likes")
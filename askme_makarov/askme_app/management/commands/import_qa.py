@@ -0,0 +1,66 @@
+import gzip
+import json
+
+from django.core.management import BaseCommand, CommandError
+from django.db import router, transaction
+
+from askme_app.corpus import SECTIONS, REFERENCED, IdMap, Progress, original_dates
+from askme_app.models import ProfileStats, Question
+
+
+class Command(BaseCommand):
+    help = "Imports a file written by export_qa with batched inserts, giving every record a new id"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **kwargs):
+        self.batch_size = kwargs['batch_size']
+        self.sections = {record_type: (model, foreign_keys) for record_type, model, foreign_keys in SECTIONS}
+        self.id_maps = {record_type: IdMap() for record_type in REFERENCED}
+        self.progress = Progress(self.stderr)
+
+        batch, batch_type = [], None
+        with original_dates(model for _, model, _ in SECTIONS), gzip.open(kwargs['path'], 'rt', encoding='utf-8') as source:
+            for line_number, line in enumerate(source, 1):
+                try:
+                    record = json.loads(line)
+                    record_type, data = record['type'], record['data']
+                except (ValueError, KeyError, TypeError):
+                    raise CommandError(f"Line {line_number} is not an export_qa record")
+                if record_type not in self.sections:
+                    raise CommandError(f"Line {line_number} has unknown record type {record_type!r}")
+                if record_type != batch_type or len(batch) >= self.batch_size:
+                    self.flush(batch_type, batch)
+                    batch, batch_type = [], record_type
+                batch.append(data)
+            self.flush(batch_type, batch)
+
+        Question.manager.rebuild_search_index()
+        ProfileStats.manager.rebuild(batch_size=self.batch_size)
+        self.stdout.write(f"Imported {self.progress.summary()}")
+
+    def flush(self, record_type, batch):
+        if not batch:
+            return
+        model, foreign_keys = self.sections[record_type]
+        pk_name = model._meta.pk.attname
+        old_ids = []
+        objects = []
+        for data in batch:
+            old_ids.append(data.pop(pk_name))
+            for column, target_type in foreign_keys.items():
+                try:
+                    data[column] = self.id_maps[target_type][data[column]]
+                except KeyError:
+                    raise CommandError(f"{record_type} {old_ids[-1]} points to a missing {target_type} {data[column]}")
+            objects.append(model(**data))
+
+        with transaction.atomic(using=router.db_for_write(model)):
+            created = model._default_manager.bulk_create(objects)
+        if record_type in self.id_maps:
+            id_map = self.id_maps[record_type]
+            for old_id, obj in zip(old_ids, created):
+                id_map.add(old_id, obj.pk)
+        self.progress.tick(record_type, len(batch))
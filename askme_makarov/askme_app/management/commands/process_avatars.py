@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+
+from askme_app import avatars
+from askme_app.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Makes thumbnails for uploaded avatars that have none yet, e.g. after changing avatars.SIZES"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Reprocess every avatar, not only new ones")
+
+    def handle(self, *args, **kwargs):
+        profiles = Profile.manager.exclude(avatar='').exclude(avatar__isnull=True)
+        if not kwargs['all']:
+            profiles = profiles.filter(avatar_hash='')
+        processed = 0
+        for profile_id in profiles.values_list('id', flat=True).order_by('id').iterator():
+            try:
+                avatars.process(profile_id)
+                processed += 1
+            except Exception as e:
+                self.stderr.write(f"Profile {profile_id}: {e}")
+        self.stdout.write(f"Processed {processed} avatars")
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from askme_app.models import Question
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored hot ranking score of every question"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **kwargs):
+        updated = Question.manager.rebuild_hot_scores(batch_size=kwargs['batch_size'])
+        self.stdout.write(f"Rebuilt hot scores of {updated} questions")
@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from askme_app.models import ProfileStats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the question, answer, like and reputation counters of every profile"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **kwargs):
+        created = ProfileStats.manager.rebuild(batch_size=kwargs['batch_size'])
+        self.stdout.write(f"Rebuilt stats of {created} profiles")
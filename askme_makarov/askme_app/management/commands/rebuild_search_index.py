@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from askme_app.models import Question
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of questions and their answers"
+
+    def handle(self, *args, **kwargs):
+        Question.manager.rebuild_search_index()
+        self.stdout.write("Search index rebuilt")
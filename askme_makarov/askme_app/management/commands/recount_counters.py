@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from askme_app.models import Question, Comment
+
+
+class Command(BaseCommand):
+    help = "Recomputes stored like and answer counters of questions and comments"
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            questions = Question.manager.recount_counters()
+            comments = Comment.manager.recount_counters()
+        self.stdout.write(f"Recounted {questions} questions and {comments} comments")
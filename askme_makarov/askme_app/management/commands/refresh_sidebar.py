@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from askme_app import sidebar
+
+
+class Command(BaseCommand):
+    help = "Recomputes the cached popular tags and best members"
+
+    def handle(self, *args, **kwargs):
+        data = sidebar.refresh()
+        self.stdout.write(f"Cached {len(data['tags'])} tags and {len(data['users'])} members")
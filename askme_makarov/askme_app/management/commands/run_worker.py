@@ -0,0 +1,22 @@
+import signal
+
+from django.core.management import BaseCommand
+
+from askme_app.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs (thumbnails, search indexing) until stopped with Ctrl+C or SIGTERM"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2, help="Jobs run at once, one thread each")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **kwargs):
+        worker = Worker(concurrency=kwargs['concurrency'], burst=kwargs['burst'])
+        # The running jobs are finished before exiting.
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        self.stdout.write(f"Worker {worker.name} running {worker.concurrency} jobs at once")
+        worker.run()
+        self.stdout.write(f"Processed {worker.processed} jobs, {worker.failed} failed")
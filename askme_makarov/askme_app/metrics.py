@@ -0,0 +1,120 @@
+import threading
+from bisect import bisect_left
+
+# Metrics live in the memory of each process, like the in-process tag index and live broker: every
+# worker exposes its own numbers on /metrics and Prometheus sums them per instance.
+
+_lock = threading.Lock()
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with _lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket (last one is +Inf), sum]
+        self.values = {}
+
+    def observe(self, labels, value):
+        position = bisect_left(self.buckets, value)
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][position] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with _lock:
+            items = sorted((labels, list(counts), total) for labels, (counts, total) in self.values.items())
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+REGISTRY = []
+
+
+def counter(*args, **kwargs):
+    metric = Counter(*args, **kwargs)
+    REGISTRY.append(metric)
+    return metric
+
+
+def histogram(*args, **kwargs):
+    metric = Histogram(*args, **kwargs)
+    REGISTRY.append(metric)
+    return metric
+
+
+request_duration = histogram('askme_request_duration_seconds', 'Time spent in the view and middleware.', ('view',))
+request_queries = histogram('askme_request_db_queries', 'SQL queries per request.', ('view',), QUERY_BUCKETS)
+request_db_duration = histogram('askme_request_db_duration_seconds', 'Time spent in SQL per request.', ('view',))
+queries_total = counter('askme_db_queries_total', 'SQL queries by the manager method that issued them.',
+                        ('view', 'source'))
+query_seconds_total = counter('askme_db_query_seconds_total', 'Time spent in SQL by manager method.',
+                              ('view', 'source'))
+duplicate_queries_total = counter('askme_db_duplicate_queries_total',
+                                  'Repeats of the same SQL within one request (N+1 candidates).', ('view', 'source'))
+
+throttled_total = counter('askme_throttled_requests_total', 'POSTs rejected by the password throttle.', ('scope',))
+page_cache_hits_total = counter('askme_page_cache_hits_total', 'Anonymous page cache hits.')
+page_cache_misses_total = counter('askme_page_cache_misses_total', 'Anonymous page cache misses.')
+
+
+def sample_lines(name, help_text, kind, value, label_name=None):
+    # For values kept elsewhere (e.g. the job counts in the database). With label_name,
+    # value maps label values to values.
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    if label_name is None:
+        return lines + [f'{name} {value}']
+    return lines + [f'{name}{_labels((label_name,), (label,))} {v}' for label, v in sorted(value.items())]
+
+
+def render(extra_lines=()):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
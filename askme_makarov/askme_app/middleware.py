@@ -0,0 +1,146 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from askme_app import metrics
+from askme_app.instrumentation import QueryRecorder, recording
+from askme_app.models import Profile
+from askme_app.staticfiles import serve_precompressed
+
+logger = logging.getLogger('askme_app.sql')
+
+PROFILE_SESSION_KEY = '_profile'
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Counts and times the SQL of every request by the manager method that issued it, reports it in
+    a Server-Timing header (visible in the browser's network panel) and adds it to /metrics.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with recording(QueryRecorder()) as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with recording(QueryRecorder()) as recorder:
+            response = await self.get_response(request)
+        return self.report(request, response, recorder, time.perf_counter() - start)
+
+    def report(self, request, response, recorder, duration):
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        metrics.request_duration.observe((view,), duration)
+        metrics.request_queries.observe((view,), recorder.count)
+        metrics.request_db_duration.observe((view,), recorder.duration)
+        for source, (count, seconds) in recorder.by_label.items():
+            metrics.queries_total.inc((view, source), count)
+            metrics.query_seconds_total.inc((view, source), seconds)
+
+        duplicates = recorder.duplicates(getattr(settings, 'SQL_DUPLICATE_THRESHOLD', 2))
+        for (source, sql), count in duplicates.items():
+            metrics.duplicate_queries_total.inc((view, source), count - 1)
+            logger.warning("%s ran the same query %d times in %s: %s", source, count, view, sql)
+
+        timings = [f'total;dur={duration * 1000:.1f}',
+                   f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"']
+        slowest = sorted(recorder.by_label.items(), key=lambda item: -item[1][1])[:5]
+        for source, (count, seconds) in slowest:
+            timings.append(f'{source};dur={seconds * 1000:.1f};desc="{count} queries"')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+
+class PrecompressedStaticMiddleware:
+    """
+    Serves the output of build_static from STATIC_ROOT when DEBUG is off, choosing the .br or .gz
+    copy by Accept-Encoding. A front web server doing the same (gzip_static/brotli_static) can
+    take over; the middleware then simply never sees a static request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def is_static(self, request):
+        return not settings.DEBUG and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.is_static(request):
+            response = serve_precompressed(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_static(request):
+            # Only static requests pay for the thread the file lookup runs in.
+            response = await sync_to_async(serve_precompressed)(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+
+def get_request_profile(request):
+    if not request.user.is_authenticated:
+        return None
+    cached = request.session.get(PROFILE_SESSION_KEY)
+    if cached is not None:
+        # from_db() rather than Profile(user=...): assigning the relation asks the router for a
+        # write database, which would pin the client to the primary.
+        profile = Profile.from_db(None, ['id', 'user_id', 'avatar', 'avatar_hash'],
+                                  [cached['id'], request.user.id, cached['avatar'], cached['avatar_hash']])
+        Profile.user.field.set_cached_value(profile, request.user)
+        return profile
+    profile = Profile.manager.get_session_profile(request.user.id)
+    # Not kept while the avatar is being processed: the worker cannot update the session, so the
+    # profile is read again until its thumbnails are there.
+    if profile is not None and not (profile.avatar and not profile.avatar_hash):
+        request.session[PROFILE_SESSION_KEY] = {'id': profile.id, 'avatar': profile.avatar.name,
+                                                'avatar_hash': profile.avatar_hash}
+    return profile
+
+
+def forget_profile(request):
+    request.session.pop(PROFILE_SESSION_KEY, None)
+
+
+class ProfileMiddleware:
+    """
+    request.profile: the logged in user's Profile (None for anonymous users), loaded on first use
+    and then kept in the session, so views and the navbar do not query it on every request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Lazy in both modes: under ASGI it is first used by the views and templates, which run in
+        # the sync thread.
+        request.profile = SimpleLazyObject(lambda: get_request_profile(request))
+        return self.get_response(request)
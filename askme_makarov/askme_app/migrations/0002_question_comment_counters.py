@@ -0,0 +1,65 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.manager
+
+
+def fill_counters(apps, schema_editor):
+    Question = apps.get_model('askme_app', 'Question')
+    Comment = apps.get_model('askme_app', 'Comment')
+    QuestionLike = apps.get_model('askme_app', 'QuestionLike')
+    CommentLike = apps.get_model('askme_app', 'CommentLike')
+
+    def count_of(model, field):
+        return Coalesce(Subquery(
+            model._default_manager.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(c=Count('id')).values('c')
+        ), Value(0))
+
+    Question.manager.update(likes_count=count_of(QuestionLike, 'question'),
+                            answers_count=count_of(Comment, 'question'))
+    Comment.manager.update(likes_count=count_of(CommentLike, 'comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askme_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='comment',
+            managers=[
+                ('manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='content',
+            field=models.TextField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='content',
+            field=models.TextField(max_length=255),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
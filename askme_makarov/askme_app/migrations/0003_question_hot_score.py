@@ -0,0 +1,49 @@
+# Generated by Django 4.2.6 on 2026-10-18 13:02
+
+import math
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# models.hot_score() at the time, copied so that this migration keeps computing the same scores when
+# the formula changes.
+HOT_SCORE_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+HOT_SCORE_DECAY = 45000
+
+
+def hot_score(likes, answers, create_date):
+    activity = max(likes + 2 * answers, 1)
+    age = (create_date - HOT_SCORE_EPOCH).total_seconds()
+    return round(math.log10(activity) + age / HOT_SCORE_DECAY, 7)
+
+
+def fill_hot_scores(apps, schema_editor):
+    Question = apps.get_model('askme_app', 'Question')
+    batch = []
+    for question in Question.manager.only('id', 'likes_count', 'answers_count', 'create_date').iterator(chunk_size=2000):
+        question.hot_score = hot_score(question.likes_count, question.answers_count, question.create_date)
+        batch.append(question)
+        if len(batch) == 2000:
+            Question.manager.bulk_update(batch, ['hot_score'])
+            batch = []
+    Question.manager.bulk_update(batch, ['hot_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askme_app', '0002_question_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='hot_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-hot_score', '-id'], name='question_hot_score_idx'),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+    ]
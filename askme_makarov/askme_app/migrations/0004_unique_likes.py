@@ -0,0 +1,35 @@
+# Generated by Django 4.2.6 on 2026-10-18 13:03
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    for model_name, target, counted_model in (('QuestionLike', 'question', 'Question'),
+                                              ('CommentLike', 'comment', 'Comment')):
+        Like = apps.get_model('askme_app', model_name)
+        Target = apps.get_model('askme_app', counted_model)
+        duplicates = Like._default_manager.values('author', target).order_by() \
+            .annotate(n=Count('id'), keep=Min('id')).filter(n__gt=1)
+        for row in list(duplicates):
+            Like._default_manager.filter(author=row['author'], **{target: row[target]}).exclude(pk=row['keep']).delete()
+            Target._default_manager.filter(pk=row[target]).update(likes_count=F('likes_count') - (row['n'] - 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askme_app', '0003_question_hot_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='commentlike',
+            constraint=models.UniqueConstraint(fields=('author', 'comment'), name='unique_comment_like'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionlike',
+            constraint=models.UniqueConstraint(fields=('author', 'question'), name='unique_question_like'),
+        ),
+    ]
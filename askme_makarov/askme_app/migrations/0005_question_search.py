@@ -0,0 +1,54 @@
+# Generated by Django 4.2.6 on 2026-10-18 13:20
+
+from django.db import migrations
+
+POSTGRES_FORWARDS = [
+    """
+    CREATE TABLE askme_app_question_search (
+        question_id bigint PRIMARY KEY REFERENCES askme_app_question (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX askme_app_question_search_document ON askme_app_question_search USING gin (document)",
+    """
+    INSERT INTO askme_app_question_search (question_id, document)
+    SELECT q.id, setweight(to_tsvector('english', q.title), 'A')
+        || setweight(to_tsvector('english', q.content), 'B')
+        || setweight(to_tsvector('english', coalesce(
+            (SELECT string_agg(c.content, ' ') FROM askme_app_comment c WHERE c.question_id = q.id), '')), 'C')
+    FROM askme_app_question q
+    """,
+]
+POSTGRES_BACKWARDS = ["DROP TABLE askme_app_question_search"]
+
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE askme_app_question_fts USING fts5(title, content, answers, tokenize = 'porter unicode61')",
+    """
+    INSERT INTO askme_app_question_fts (rowid, title, content, answers)
+    SELECT q.id, q.title, q.content, coalesce(
+        (SELECT group_concat(c.content, ' ') FROM askme_app_comment c WHERE c.question_id = q.id), '')
+    FROM askme_app_question q
+    """,
+]
+SQLITE_BACKWARDS = ["DROP TABLE askme_app_question_fts"]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askme_app', '0004_unique_likes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARDS, 'sqlite': SQLITE_FORWARDS}),
+            run({'postgresql': POSTGRES_BACKWARDS, 'sqlite': SQLITE_BACKWARDS}),
+        ),
+    ]
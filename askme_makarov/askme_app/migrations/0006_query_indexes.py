@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askme_app', '0005_question_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['question', '-likes_count', 'create_date', 'id'], name='comment_question_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['question', 'create_date'], name='comment_question_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['-create_date', '-id'], name='question_new_idx'),
+        ),
+    ]
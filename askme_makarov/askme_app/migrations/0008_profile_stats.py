@@ -0,0 +1,71 @@
+# Generated by Django 4.2.6 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+import django.db.models.manager
+
+# The weights of models.REPUTATION_WEIGHTS at the time, copied so that this migration keeps
+# computing the same values when they change.
+WEIGHTS = {'questions_count': 1, 'answers_count': 2, 'likes_received': 5, 'accepted_answers': 15}
+
+
+def fill_profile_stats(apps, schema_editor):
+    Profile = apps.get_model('askme_app', 'Profile')
+    Question = apps.get_model('askme_app', 'Question')
+    Comment = apps.get_model('askme_app', 'Comment')
+    ProfileStats = apps.get_model('askme_app', 'ProfileStats')
+
+    def total(model, aggregate, **filters):
+        return Coalesce(Subquery(
+            model._default_manager.filter(author=OuterRef('pk'), **filters).order_by()
+            .values('author').annotate(c=aggregate).values('c')
+        ), Value(0))
+
+    rows = Profile._default_manager.annotate(
+        questions_count=total(Question, Count('id')), answers_count=total(Comment, Count('id')),
+        accepted_answers=total(Comment, Count('id'), is_correct=True),
+        likes_on_questions=total(Question, Sum('likes_count')),
+        likes_on_answers=total(Comment, Sum('likes_count')),
+    ).values_list('id', 'questions_count', 'answers_count', 'accepted_answers', 'likes_on_questions',
+                  'likes_on_answers')
+
+    batch = []
+    for profile_id, questions, answers, accepted, likes_on_questions, likes_on_answers \
+            in rows.iterator(chunk_size=2000):
+        counts = {'questions_count': questions, 'answers_count': answers,
+                  'likes_received': likes_on_questions + likes_on_answers, 'accepted_answers': accepted}
+        reputation = sum(WEIGHTS[name] * value for name, value in counts.items())
+        batch.append(ProfileStats(profile_id=profile_id, reputation=reputation, **counts))
+        if len(batch) == 2000:
+            ProfileStats._default_manager.bulk_create(batch)
+            batch = []
+    ProfileStats._default_manager.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askme_app', '0007_profile_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileStats',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='askme_app.profile')),
+                ('questions_count', models.IntegerField(default=0)),
+                ('answers_count', models.IntegerField(default=0)),
+                ('likes_received', models.IntegerField(default=0)),
+                ('accepted_answers', models.IntegerField(default=0)),
+                ('reputation', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-reputation', '-profile'], name='profile_stats_reputation_idx')],
+            },
+            managers=[
+                ('manager', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.RunPython(fill_profile_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 13:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askme_app', '0008_profile_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='create_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='create_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
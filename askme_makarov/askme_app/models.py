@@ -1,100 +1,363 @@
-from django.db import models
+import math
+import secrets
+from datetime import datetime, timedelta, timezone
+
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import User
-from django.db.models import Count
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone as django_timezone
+
+from askme_app import live, page_cache, search
+from askme_app.instrumentation import instrumented
+from askme_app.jobs import task
+from askme_app.paginators import CursorPage
 
 
 # Create your models here.
 
+HOT_SCORE_EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+HOT_SCORE_DECAY = 45000
 
-class ProfileManager(models.Manager):
-    def get_queryset(self):
-        return super().get_queryset().annotate(
-            popular_question_count=Count('questions'),
-            popular_answer_count=Count('comments')
-        )
 
+def hot_score(likes, answers, create_date):
+    # Reddit-style ranking: every 10x more activity is worth HOT_SCORE_DECAY seconds of freshness,
+    # so older questions sink without their scores ever having to be touched again.
+    activity = max(likes + 2 * answers, 1)
+    age = (create_date - HOT_SCORE_EPOCH).total_seconds()
+    return round(math.log10(activity) + age / HOT_SCORE_DECAY, 7)
+
+
+class ProfileManager(models.Manager):
+    @instrumented
     def get_top_users(self, n):
-        qs = self.get_queryset().order_by('-popular_question_count', '-popular_answer_count')[:n]
-        return qs
+        # Walks the reputation index of profile_stats and joins only the n profiles it returns.
+        return self.get_queryset().filter(stats__reputation__gt=0).order_by('-stats__reputation', '-stats__profile_id')[:n]
 
+    @instrumented
     def get_user_by_id(self, user_id):
         return User.objects.get(pk=user_id)
 
+    @instrumented
     def get_profile_by_id(self, user_id):
         return Profile.manager.get(user_id=user_id)
 
+    @instrumented
+    def get_session_profile(self, user_id):
+        return self.get_queryset().only('id', 'user_id', 'avatar', 'avatar_hash').filter(user_id=user_id).first()
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    avatar = models.ImageField(upload_to='static/img', null=True, blank=True)
+    # The upload as it came; pages show the thumbnails named after avatar_hash (askme_app/avatars.py).
+    avatar = models.ImageField(upload_to='avatars/originals', null=True, blank=True)
+    avatar_hash = models.CharField(max_length=32, blank=True, default='')
     manager = ProfileManager()
 
     def __str__(self):
         return f"{self.user.username} profile"
 
 
+# Points per counted item of ProfileStats.reputation
+REPUTATION_WEIGHTS = {
+    'questions_count': 1,
+    'answers_count': 2,
+    'likes_received': 5,
+    'accepted_answers': 15,
+}
+
+
+def reputation(**counts):
+    return sum(REPUTATION_WEIGHTS[name] * value for name, value in counts.items())
+
+
+class ProfileStatsManager(models.Manager):
+    @instrumented
+    def bump(self, profile_id, **deltas):
+        """
+        Adds deltas to the counters of a profile, and their weight to its reputation, in one UPDATE
+        that is safe under concurrent writers. Call it in the transaction of the write it counts.
+        """
+        changes = {name: F(name) + delta for name, delta in deltas.items()}
+        changes['reputation'] = F('reputation') + reputation(**deltas)
+        if not self.filter(pk=profile_id).update(**changes):
+            # First activity of the profile: create the row (a concurrent writer may win) and retry.
+            self.bulk_create([ProfileStats(profile_id=profile_id)], ignore_conflicts=True)
+            self.filter(pk=profile_id).update(**changes)
+
+    def rebuild(self, batch_size=2000):
+        # Counts with one correlated subquery each; joining all of them to profiles at once would
+        # multiply the rows (the fan-out the old annotated leaderboard suffered from).
+        def count(model, **filters):
+            return Coalesce(Subquery(
+                model.manager.filter(author=OuterRef('pk'), **filters).order_by()
+                .values('author').annotate(c=Count('id')).values('c')
+            ), Value(0))
+
+        def likes(model):
+            return Coalesce(Subquery(
+                model.manager.filter(author=OuterRef('pk')).order_by()
+                .values('author').annotate(c=Sum('likes_count')).values('c')
+            ), Value(0))
+
+        rows = Profile.manager.annotate(
+            questions_count=count(Question), answers_count=count(Comment),
+            accepted_answers=count(Comment, is_correct=True),
+            likes_on_questions=likes(Question), likes_on_answers=likes(Comment),
+        ).values_list('id', 'questions_count', 'answers_count', 'accepted_answers', 'likes_on_questions',
+                      'likes_on_answers')
+
+        with transaction.atomic(using=router.db_for_write(ProfileStats)):
+            self.all().delete()
+            batch, created = [], 0
+            for profile_id, questions, answers, accepted, likes_on_questions, likes_on_answers \
+                    in rows.iterator(chunk_size=batch_size):
+                counts = {'questions_count': questions, 'answers_count': answers,
+                          'likes_received': likes_on_questions + likes_on_answers, 'accepted_answers': accepted}
+                batch.append(ProfileStats(profile_id=profile_id, reputation=reputation(**counts), **counts))
+                if len(batch) == batch_size:
+                    created += len(self.bulk_create(batch))
+                    batch = []
+            if batch:
+                created += len(self.bulk_create(batch))
+        return created
+
+
+class ProfileStats(models.Model):
+    profile = models.OneToOneField('Profile', on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    questions_count = models.IntegerField(default=0)
+    answers_count = models.IntegerField(default=0)
+    likes_received = models.IntegerField(default=0)
+    accepted_answers = models.IntegerField(default=0)
+    reputation = models.IntegerField(default=0)
+    manager = ProfileStatsManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-reputation', '-profile'], name='profile_stats_reputation_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.profile_id} stats"
+
+
 class QuestionManager(models.Manager):
 
+    @instrumented
     def get_new_questions(self):
-        return Question.manager.all().order_by('-create_date')
+        return Question.manager.all().order_by('-create_date', '-id')
 
+    @instrumented
     def get_top_questions(self):
-        return self.get_queryset().annotate(num_likes=Count('question_likes')) \
-            .order_by('-num_likes') \
-            .prefetch_related('question_likes')
+        return self.get_queryset().order_by('-hot_score', '-id')
 
+    def for_listing(self, queryset):
+        # Likes and answers are stored columns, so a page is one query for the rows and authors
+        # plus one for the tags of all rows, whatever the page size.
+        return queryset.select_related('author__user').prefetch_related('tags')
+
+    @instrumented
     def get_question_by_id(self, id):
         return Question.manager.get(pk=id)
 
+    @instrumented
+    def index_for_search(self, question):
+        search.get_backend(router.db_for_write(Question)).index_question(question.pk, question.title, question.content)
+
+    def rebuild_search_index(self):
+        # For rows written in bulk (fill_db, import_qa), which queue no indexing jobs.
+        using = router.db_for_write(Question)
+        with transaction.atomic(using=using):
+            search.get_backend(using).rebuild()
+
+    @instrumented
+    def search(self, query, cursor=None, per_page=20):
+        ids, next_cursor, previous_cursor = search.get_backend(router.db_for_read(Question)) \
+            .search(query.strip(), cursor, per_page)
+        questions = self.for_listing(self.filter(pk__in=ids)).in_bulk()
+        return CursorPage([questions[pk] for pk in ids if pk in questions], next_cursor, previous_cursor)
+
+    @instrumented
+    def touch(self, question_id, listings=True):
+        # Something shown on the question's page changed, and with listings=True its row in the
+        # listings too: moves the validators of conditional GETs (conditional.py) and drops the
+        # cached anonymous pages.
+        # Tag pages take their validators from the page cache version of the tag, which
+        # invalidate_pages() bumps: updating the Tag rows would make popular tags a point of lock
+        # contention between unrelated questions.
+        self.filter(pk=question_id).update(last_activity=django_timezone.now())
+        self.invalidate_pages(question_id, listings)
+
+    @instrumented
+    def get_last_activity(self, question_id):
+        return self.filter(pk=question_id).values_list('last_activity', flat=True).first()
+
+    def invalidate_pages(self, question_id, listings=True):
+        # Cached anonymous pages showing the question: its own page and, when the row shown in
+        # listings changed, the index/hot listings and the pages of its tags.
+        scopes = [page_cache.question_scope(question_id)]
+        if listings:
+            tag_names = Tag.manager.filter(questions=question_id).values_list('name', flat=True)
+            scopes += [page_cache.LISTINGS] + [page_cache.tag_scope(name) for name in tag_names]
+        page_cache.bump_on_commit(*scopes)
+
+    @instrumented
+    def update_hot_score(self, question_id):
+        # Returns the like count the new score was computed from.
+        row = self.filter(pk=question_id).values_list('likes_count', 'answers_count', 'create_date').first()
+        if row is None:
+            return None
+        self.filter(pk=question_id).update(hot_score=hot_score(*row))
+        return row[0]
+
+    def rebuild_hot_scores(self, batch_size=2000):
+        rows = self.get_queryset().values_list('id', 'likes_count', 'answers_count', 'create_date') \
+            .iterator(chunk_size=batch_size)
+        batch = []
+        updated = 0
+        for question_id, likes, answers, create_date in rows:
+            batch.append(Question(id=question_id, hot_score=hot_score(likes, answers, create_date)))
+            if len(batch) == batch_size:
+                updated += self.bulk_update(batch, ['hot_score'])
+                batch = []
+        if batch:
+            updated += self.bulk_update(batch, ['hot_score'])
+        return updated
+
+    def recount_counters(self):
+        likes = QuestionLike.objects.filter(question=OuterRef('pk')).order_by() \
+            .values('question').annotate(c=Count('id')).values('c')
+        answers = Comment.manager.filter(question=OuterRef('pk')).order_by() \
+            .values('question').annotate(c=Count('id')).values('c')
+        return self.get_queryset().update(
+            likes_count=Coalesce(Subquery(likes), Value(0)),
+            answers_count=Coalesce(Subquery(answers), Value(0))
+        )
+
 
 class Question(models.Model):
     author = models.ForeignKey('Profile', on_delete=models.CASCADE, related_name='questions')
-    create_date = models.DateTimeField(auto_now=True)
+    create_date = models.DateTimeField(default=django_timezone.now)
+    # Last answer or like: the validator of conditional GETs of the question's page
+    last_activity = models.DateTimeField(default=django_timezone.now)
     title = models.CharField(max_length=64)
     content = models.TextField(max_length=255)
     tags = models.ManyToManyField('Tag', related_name='questions')
+    likes_count = models.IntegerField(default=0)
+    answers_count = models.IntegerField(default=0)
+    hot_score = models.FloatField(default=0)
     manager = QuestionManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-hot_score', '-id'], name='question_hot_score_idx'),
+            models.Index(fields=['-create_date', '-id'], name='question_new_idx'),
+        ]
+
     def __str__(self):
         return f"Question {self.title}"
 
     def get_answers_count(self):
-        return self.comments.count()
+        return self.answers_count
 
     def get_likes_count(self):
-        return self.question_likes.count()
+        return self.likes_count
+
+    @property
+    def fragment_version(self):
+        # Title, content and tags never change after asking, so the counters and the author's avatar
+        # identify the rendering.
+        return f"{self.likes_count}.{self.answers_count}.{self.author.avatar_hash}"
 
 
 class CommentManager(models.Manager):
+    @instrumented
     def get_comments_ordered_by_likes(self, question_id):
-        comments = self.filter(question=question_id).annotate(num_likes=Count('comment_likes')).order_by('-num_likes',
-                                                                                                         'create_date')
+        comments = self.filter(question=question_id).select_related('author') \
+            .order_by('-likes_count', 'create_date', 'id')
         return comments
 
+    @instrumented
+    def create_comment(self, content, author, question):
+        with transaction.atomic():
+            comment = self.create(content=content, author=author, question=question)
+            Question.manager.filter(pk=question.pk).update(answers_count=F('answers_count') + 1)
+            ProfileStats.manager.bump(author.pk, answers_count=1)
+            Question.manager.update_hot_score(question.pk)
+            index_answer.delay(comment.pk)
+            Question.manager.touch(question.pk)
+            live.answer_added(comment)
+        return comment
+
+    def recount_counters(self):
+        likes = CommentLike.objects.filter(comment=OuterRef('pk')).order_by() \
+            .values('comment').annotate(c=Count('id')).values('c')
+        return self.get_queryset().update(likes_count=Coalesce(Subquery(likes), Value(0)))
+
 
 class Comment(models.Model):
     author = models.ForeignKey('Profile', on_delete=models.CASCADE, related_name='comments')
     question = models.ForeignKey('Question', on_delete=models.CASCADE, related_name='comments')
-    create_date = models.DateTimeField(auto_now=True)
+    create_date = models.DateTimeField(default=django_timezone.now)
     content = models.TextField(max_length=255)
     is_correct = models.BooleanField(default=False)
+    likes_count = models.IntegerField(default=0)
     manager = CommentManager()
 
+    class Meta:
+        indexes = [
+            # get_comments_ordered_by_likes reads one question's answers already in page order.
+            models.Index(fields=['question', '-likes_count', 'create_date', 'id'], name='comment_question_likes_idx'),
+            models.Index(fields=['question', 'create_date'], name='comment_question_date_idx'),
+        ]
+
     def __str__(self):
         return f"Comment {self.content}"
 
     def get_likes_count(self):
-        return self.comment_likes.count()
+        return self.likes_count
+
+    @property
+    def fragment_version(self):
+        return f"{self.likes_count}.{int(self.is_correct)}.{self.author.avatar_hash}"
+
+
+@task()
+def index_question(question_id):
+    question = Question.manager.db_manager(router.db_for_write(Question)).filter(pk=question_id).first()
+    if question is not None:
+        Question.manager.index_for_search(question)
+
+
+@task()
+def index_answer(comment_id):
+    comment = Comment.manager.db_manager(router.db_for_write(Comment)).filter(pk=comment_id) \
+        .values_list('question_id', 'content').first()
+    if comment is not None:
+        search.get_backend(router.db_for_write(Question)).add_answer(*comment)
 
 
 class TagManager(models.Manager):
+    @instrumented
     def top_of_tags(self, n):
         return self.get_queryset().annotate(num_questions=Count('questions')).order_by('-num_questions')[:n]
 
+    @instrumented
     def get_questions_by_tag(self, tag_name):
         tag = Tag.manager.get(name=tag_name)
-        return tag.questions.all()
+        return tag.questions.order_by('-create_date', '-id')
+
+    @instrumented
+    async def aget_questions_by_tag(self, tag_name):
+        tag = await Tag.manager.aget(name=tag_name)
+        return tag.questions.order_by('-create_date', '-id')
 
+    def get_listing_version(self, tag_name):
+        # Changes with every committed write shown in the tag's listing (QuestionManager.touch), and
+        # is read from the shared cache without a query.
+        return page_cache.get_versions([page_cache.tag_scope(tag_name)])[0]
+
+    @instrumented
     def get_all_tag_names(self):
         return list(self.get_queryset().values_list('name', flat=True))
 
@@ -107,27 +370,206 @@ class Tag(models.Model):
         return f"{self.name}"
 
 
-class QuestionLikeManager(models.Manager):
+class LikeManager(models.Manager):
+    target_field = None
+
+    def _toggle(self, author_id, target_id):
+        # One DELETE undoes an existing like; otherwise one INSERT adds it. The unique constraint on
+        # (author, target) makes a concurrent duplicate insert a no-op instead of a second like.
+        # Returns (liked, change of the like count).
+        db = router.db_for_write(self.model)
+        deleted, _ = self.using(db).filter(author_id=author_id, **{self.target_field + '_id': target_id}).delete()
+        if deleted:
+            return False, -deleted
+        connection = connections[db]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(self.model._meta.db_table)} ({quote('author_id')}, {quote(self.target_field + '_id')}) "
+                f"VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                [author_id, target_id]
+            )
+            inserted = cursor.rowcount
+        return True, inserted
+
+
+class QuestionLikeManager(LikeManager):
+    target_field = 'question'
+
+    @instrumented
     def toggle_like(self, user, question):
-        if self.filter(author=user, question=question).exists():
-            self.filter(author=user, question=question).delete()
-        else:
-            self.create(author=user, question=question)
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            liked, delta = self._toggle(user.pk, question.pk)
+            if delta:
+                Question.manager.filter(pk=question.pk).update(likes_count=F('likes_count') + delta)
+                ProfileStats.manager.bump(question.author_id, likes_received=delta)
+                Question.manager.touch(question.pk)
+            likes_count = Question.manager.update_hot_score(question.pk)
+            if delta:
+                live.question_likes_changed(question.pk, likes_count)
+        return liked, likes_count
 
 
 class QuestionLike(models.Model):
     author = models.ForeignKey('Profile', on_delete=models.CASCADE, related_name='question_likes')
     question = models.ForeignKey('Question', on_delete=models.CASCADE, related_name='question_likes')
+    objects = QuestionLikeManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'question'], name='unique_question_like'),
+        ]
 
 
-class CommentLikeManager(models.Manager):
+class CommentLikeManager(LikeManager):
+    target_field = 'comment'
+
+    @instrumented
     def toggle_like(self, user, comment):
-        if self.filter(author=user, comment=comment).exists():
-            self.filter(author=user, comment=comment).delete()
-        else:
-            self.create(author=user, comment=comment)
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            liked, delta = self._toggle(user.pk, comment.pk)
+            comments = Comment.manager.filter(pk=comment.pk)
+            if delta:
+                comments.update(likes_count=F('likes_count') + delta)
+                ProfileStats.manager.bump(comment.author_id, likes_received=delta)
+            likes_count, question_id = comments.values_list('likes_count', 'question_id').first()
+            if delta:
+                Question.manager.touch(question_id, listings=False)
+                live.comment_likes_changed(comment.pk, question_id, likes_count)
+        return liked, likes_count
 
 
 class CommentLike(models.Model):
     author = models.ForeignKey('Profile', on_delete=models.CASCADE, related_name='comment_likes')
     comment = models.ForeignKey('Comment', on_delete=models.CASCADE, related_name='comment_likes')
+    objects = CommentLikeManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'comment'], name='unique_comment_like'),
+        ]
+
+
+def _lease(worker):
+    # Tells apart the claims of the same worker, e.g. of a job requeued while it was still running.
+    return f'{worker[:90]}/{secrets.token_hex(4)}'
+
+
+class JobManager(models.Manager):
+    def _queue(self):
+        # The queue always lives on the primary: a replica may not have a job or its claim yet.
+        return self.db_manager(router.db_for_write(Job))
+
+    def enqueue(self, task_name, args, max_attempts=5, delay=0):
+        # Part of the caller's transaction: workers only see the job once the write it belongs to is
+        # committed, and never see it if that write is rolled back.
+        return self._queue().create(task=task_name, args=list(args), max_attempts=max_attempts,
+                                 run_at=django_timezone.now() + timedelta(seconds=delay))
+
+    def claim(self, worker):
+        """Marks the next due job as running for worker and returns it, or None when there is none."""
+        queue = self._queue()
+        due = queue.filter(status=Job.QUEUED, run_at__lte=django_timezone.now()).order_by('run_at', 'id')
+        if connections[queue.db].features.has_select_for_update_skip_locked:
+            # PostgreSQL: rows locked by other workers are skipped instead of waited for.
+            with transaction.atomic(using=queue.db):
+                job = due.select_for_update(skip_locked=True).first()
+                if job is None:
+                    return None
+                job.status, job.attempts, job.locked_by = Job.RUNNING, job.attempts + 1, _lease(worker)
+                job.started_at = django_timezone.now()
+                job.save(update_fields=['status', 'attempts', 'locked_by', 'started_at'])
+                return job
+        # SQLite has no row locks: take a candidate and claim it with a conditional UPDATE, which
+        # only one worker can win; the losers try the next candidate.
+        for job in due[:10]:
+            lease, started_at = _lease(worker), django_timezone.now()
+            claimed = queue.filter(pk=job.pk, status=Job.QUEUED, attempts=job.attempts).update(
+                status=Job.RUNNING, attempts=job.attempts + 1, locked_by=lease, started_at=started_at
+            )
+            if claimed:
+                job.status, job.attempts, job.locked_by, job.started_at = Job.RUNNING, job.attempts + 1, lease, started_at
+                return job
+        return None
+
+    def _leased(self, job):
+        # Only the claim that ran the job may record its outcome: once requeue_stale() gave the job
+        # to another worker, a late finish of the old one changes nothing.
+        return self._queue().filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+
+    def finish(self, job):
+        return self._leased(job).update(status=Job.DONE, finished_at=django_timezone.now(), last_error='')
+
+    def retry_or_fail(self, job, error, backoff):
+        # backoff: seconds to wait before the next attempt, or None when there is none left.
+        if backoff is None:
+            return self._leased(job).update(status=Job.FAILED, finished_at=django_timezone.now(), last_error=error)
+        return self._leased(job).update(status=Job.QUEUED, run_at=django_timezone.now() + timedelta(seconds=backoff),
+                                        locked_by='', last_error=error)
+
+    def requeue_stale(self, timeout):
+        """
+        Jobs of a worker that died or hung mid-run: queued again while they have attempts left,
+        failed otherwise, so a job that kills its worker is not retried forever. Returns the
+        numbers of requeued and failed jobs.
+        """
+        now = django_timezone.now()
+        stale = self._queue().filter(status=Job.RUNNING, started_at__lt=now - timedelta(seconds=timeout))
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, finished_at=now, locked_by='', last_error=f'Worker lost after {timeout} seconds'
+        )
+        requeued = stale.update(status=Job.QUEUED, locked_by='')
+        return requeued, failed
+
+    def purge(self, retention):
+        cutoff = django_timezone.now() - timedelta(seconds=retention)
+        return self._queue().filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff).delete()[0]
+
+    @instrumented
+    def stats(self, window):
+        """Jobs per status, age of the oldest due job and wait/run times of the jobs finished in window seconds."""
+        now = django_timezone.now()
+        queue = self._queue()
+        counts = dict(queue.order_by().values_list('status').annotate(n=Count('id')))
+        oldest = queue.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at').values_list('run_at', flat=True).first()
+        finished = queue.filter(status=Job.DONE, finished_at__gte=now - timedelta(seconds=window)) \
+            .order_by('-finished_at').values_list('run_at', 'started_at', 'finished_at')[:1000]
+        waits = [(started - run_at).total_seconds() for run_at, started, _ in finished]
+        runs = [(done - started).total_seconds() for _, started, done in finished]
+        return {
+            'counts': {status: counts.get(status, 0) for status, _ in Job.STATUSES},
+            'oldest_due_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+            'finished': len(waits),
+            'wait_avg': sum(waits) / len(waits) if waits else 0.0,
+            'wait_max': max(waits, default=0.0),
+            'run_avg': sum(runs) / len(runs) if runs else 0.0,
+        }
+
+
+class Job(models.Model):
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    # Dotted path of a function decorated with askme_app.jobs.task
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=django_timezone.now)
+    created_at = models.DateTimeField(default=django_timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    manager = JobManager()
+
+    class Meta:
+        indexes = [
+            # claim() reads the due jobs in order; purge() and stats() the recently finished ones.
+            models.Index(fields=['status', 'run_at'], name='job_due_idx'),
+            models.Index(fields=['status', 'finished_at'], name='job_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} {self.task}{tuple(self.args)} {self.status}"
@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from askme_app import metrics
+
+# Scopes are invalidated by bumping their version; a cached page is keyed by the versions of the
+# scopes it was rendered from, so a bump makes every page of the scope miss without deleting anything.
+# Versions live in the 'shared' cache, so a write served by one worker process invalidates the pages
+# of all of them; the pages themselves stay in each process's own cache, and each process counts its
+# own hits and misses on /metrics.
+LISTINGS = 'listings'
+
+
+def question_scope(question_id):
+    return f'question:{question_id}'
+
+
+def tag_scope(tag_name):
+    return f'tag:{quote(tag_name)}'
+
+
+def _version_key(scope):
+    return f'page_cache:version:{scope}'
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+
+
+def get_versions(scopes):
+    shared = caches['shared']
+    keys = [_version_key(scope) for scope in scopes]
+    found = shared.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # A lost version restarts from the clock rather than from 1, so it can never come back
+            # to a value that an older cached page was stored under.
+            value = time.time_ns() // 1000
+            if not shared.add(key, value, timeout=None):
+                value = shared.get(key, value)
+            found[key] = value
+    return [found[key] for key in keys]
+
+
+def _incr(key, initial):
+    shared = caches['shared']
+    try:
+        shared.incr(key)
+    except ValueError:
+        shared.set(key, initial, timeout=None)
+
+
+def bump(*scopes):
+    for scope in scopes:
+        _incr(_version_key(scope), time.time_ns() // 1000)
+
+
+def bump_on_commit(*scopes):
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def _lookup(request, scopes, kwargs):
+    # Returns (cache key, cached response); the key is None when the request must not be cached.
+    if request.method != 'GET' or request.user.is_authenticated:
+        return None, None
+
+    versions = get_versions(scopes(**kwargs))
+    path_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    key = f"page_cache:page:{path_hash}:{'.'.join(map(str, versions))}"
+    cached = cache.get(key)
+    if cached is None:
+        metrics.page_cache_misses_total.inc()
+        return key, None
+    metrics.page_cache_hits_total.inc()
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    patch_vary_headers(response, ['Cookie'])
+    return key, response
+
+
+def _store(key, response):
+    # Responses that set cookies (CSRF, session) belong to one visitor and are never shared.
+    if response.status_code == 200 and not response.streaming and not response.cookies:
+        cache.set(key, (response.content, response['Content-Type']), _timeout())
+
+
+def anonymous_page_cache(scopes):
+    """
+    Caches the full response of GET requests from logged-out users. ``scopes`` receives the view
+    kwargs and returns the scopes the page depends on. Works for sync and async views.
+    """
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # request.user is loaded lazily from the database, which is not allowed on the event loop.
+                key, cached = await sync_to_async(_lookup)(request, scopes, kwargs)
+                if cached is not None:
+                    return cached
+                response = await view(request, *args, **kwargs)
+                if key is not None:
+                    await sync_to_async(_store)(key, response)
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, cached = _lookup(request, scopes, kwargs)
+            if cached is not None:
+                return cached
+            response = view(request, *args, **kwargs)
+            if key is not None:
+                _store(key, response)
+            return response
+
+        return wrapper
+
+    return decorator
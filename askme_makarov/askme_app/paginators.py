@@ -0,0 +1,142 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator: every page is a "WHERE (keys) after/before cursor ORDER BY keys LIMIT n" query,
+    so its cost does not depend on how deep the page is. The ordering of the queryset is used as the
+    key and must end with a unique field (normally the primary key).
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = [self._parse_ordering(field) for field in queryset.query.order_by]
+        if not self.ordering:
+            raise ValueError("CursorPaginator needs an ordered queryset")
+
+    def _parse_ordering(self, field):
+        if not isinstance(field, str):
+            raise ValueError(f"Unsupported ordering {field!r}")
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        if name == 'pk':
+            name = self.queryset.model._meta.pk.name
+        return name, descending
+
+    def _model_field(self, name):
+        return self.queryset.model._meta.get_field(name)
+
+    def _key_values(self, obj):
+        return [self._model_field(name).value_to_string(obj) for name, _ in self.ordering]
+
+    def _after(self, values, backwards):
+        # (a, b, c) > (x, y, z) expanded to a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        # with the comparison flipped for descending keys and for walking backwards. The OR alone
+        # gives the database no range to seek to, so a >= x is ANDed on: the index is entered at the
+        # cursor instead of walked from its start.
+        condition = Q()
+        equal = Q()
+        bound = None
+        for (name, descending), raw in zip(self.ordering, values):
+            value = self._model_field(name).to_python(raw)
+            lookup = 'lt' if descending != backwards else 'gt'
+            if bound is None:
+                bound = Q(**{f'{name}__{lookup}e': value})
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return bound & condition
+
+    def _ordered(self, backwards):
+        if not backwards:
+            return self.queryset
+        return self.queryset.order_by(*[('' if descending else '-') + name for name, descending in self.ordering])
+
+    def _query(self, cursor):
+        direction, values = 'n', None
+        if cursor:
+            direction, values = decode_cursor(cursor)
+            if len(values) != len(self.ordering):
+                raise InvalidCursor(cursor)
+        backwards = direction == 'p'
+
+        queryset = self._ordered(backwards)
+        if values is not None:
+            try:
+                queryset = queryset.filter(self._after(values, backwards))
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor(cursor)
+        return queryset[:self.per_page + 1], backwards, values
+
+    def _build(self, items, backwards, values):
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            if not has_more:
+                # Walked back to the beginning: the caller serves a full first page instead of a short one.
+                return None
+            items.reverse()
+
+        next_cursor = previous_cursor = None
+        if items:
+            if backwards or has_more:
+                next_cursor = encode_cursor('n', self._key_values(items[-1]))
+            if backwards or values is not None:
+                previous_cursor = encode_cursor('p', self._key_values(items[0]))
+        return CursorPage(items, next_cursor, previous_cursor)
+
+    def page(self, cursor=None):
+        queryset, backwards, values = self._query(cursor)
+        page = self._build(list(queryset), backwards, values)
+        return page if page is not None else self.page()
+
+    async def apage(self, cursor=None):
+        queryset, backwards, values = self._query(cursor)
+        page = self._build([item async for item in queryset], backwards, values)
+        return page if page is not None else await self.apage()
@@ -0,0 +1,173 @@
+import re
+
+from django.db import connections
+
+from askme_app.paginators import InvalidCursor, decode_cursor, encode_cursor
+
+QUESTION_TABLE = 'askme_app_question'
+COMMENT_TABLE = 'askme_app_comment'
+
+# Relevance is multiplied by up to 2x depending on likes, saturating so that likes cannot outweigh
+# a much better text match.
+LIKES_BOOST = "(1.0 + q.likes_count * 1.0 / (q.likes_count + 10))"
+
+
+class SearchBackend:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=()):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            if cursor.description:
+                return cursor.fetchall()
+
+    def index_question(self, question_id, title, content):
+        pass
+
+    def add_answer(self, question_id, content):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def ranked_sql(self):
+        # SQL selecting (id, score) of the questions matching the single %s parameter,
+        # or None when the database has no full-text support.
+        return None
+
+    def prepare_query(self, query):
+        return query
+
+    def search(self, query, cursor=None, per_page=20):
+        """
+        Returns ([question ids], next cursor, previous cursor), ordered by combined score.
+        Pages are keyset-paginated on (score, id) like the other listings.
+        """
+        ranked = self.ranked_sql()
+        prepared = self.prepare_query(query)
+        if ranked is None or not prepared:
+            return [], None, None
+        backwards, after = False, None
+        if cursor:
+            direction, after = decode_cursor(cursor)
+            backwards = direction == 'p'
+
+        sql = f"SELECT id, score FROM ({ranked}) ranked"
+        params = [prepared]
+        if after is not None:
+            try:
+                score, last_id = float(after[0]), int(after[1])
+            except (IndexError, TypeError, ValueError):
+                raise InvalidCursor(cursor)
+            compare = '>' if backwards else '<'
+            sql += f" WHERE score {compare} %s OR (score = %s AND id {compare} %s)"
+            params += [score, score, last_id]
+        order = 'ASC' if backwards else 'DESC'
+        sql += f" ORDER BY score {order}, id {order} LIMIT %s"
+        params.append(per_page + 1)
+
+        rows = self.execute(sql, params)
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            if not has_more:
+                return self.search(query, per_page=per_page)
+            rows.reverse()
+        next_cursor = previous_cursor = None
+        if rows:
+            if backwards or has_more:
+                next_cursor = encode_cursor('n', list(rows[-1][::-1]))
+            if backwards or after is not None:
+                previous_cursor = encode_cursor('p', list(rows[0][::-1]))
+        return [question_id for question_id, _ in rows], next_cursor, previous_cursor
+
+
+class PostgresSearchBackend(SearchBackend):
+    """A stored, weighted tsvector per question (title A, content B, answers C) under a GIN index."""
+
+    table = 'askme_app_question_search'
+
+    def index_question(self, question_id, title, content):
+        self.execute(
+            f"INSERT INTO {self.table} (question_id, document) VALUES "
+            f"(%s, setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B')) "
+            f"ON CONFLICT (question_id) DO UPDATE SET document = EXCLUDED.document",
+            [question_id, title, content]
+        )
+
+    def add_answer(self, question_id, content):
+        self.execute(
+            f"UPDATE {self.table} SET document = document || setweight(to_tsvector('english', %s), 'C') "
+            f"WHERE question_id = %s",
+            [content, question_id]
+        )
+
+    def rebuild(self):
+        self.execute(f"TRUNCATE {self.table}")
+        self.execute(
+            f"INSERT INTO {self.table} (question_id, document) "
+            f"SELECT q.id, setweight(to_tsvector('english', q.title), 'A') "
+            f"|| setweight(to_tsvector('english', q.content), 'B') "
+            f"|| setweight(to_tsvector('english', coalesce("
+            f"(SELECT string_agg(c.content, ' ') FROM {COMMENT_TABLE} c WHERE c.question_id = q.id), '')), 'C') "
+            f"FROM {QUESTION_TABLE} q"
+        )
+
+    def ranked_sql(self):
+        return (
+            f"SELECT q.id, ts_rank(s.document, query)::float8 * {LIKES_BOOST} AS score "
+            f"FROM {self.table} s JOIN {QUESTION_TABLE} q ON q.id = s.question_id, "
+            f"websearch_to_tsquery('english', %s) query "
+            f"WHERE s.document @@ query"
+        )
+
+
+class SqliteSearchBackend(SearchBackend):
+    """An FTS5 table whose rowid is the question id, with title, content and answers columns."""
+
+    table = 'askme_app_question_fts'
+
+    def index_question(self, question_id, title, content):
+        self.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [question_id])
+        self.execute(
+            f"INSERT INTO {self.table} (rowid, title, content, answers) VALUES (%s, %s, %s, '')",
+            [question_id, title, content]
+        )
+
+    def add_answer(self, question_id, content):
+        self.execute(
+            f"UPDATE {self.table} SET answers = answers || ' ' || %s WHERE rowid = %s",
+            [content, question_id]
+        )
+
+    def rebuild(self):
+        self.execute(f"DELETE FROM {self.table}")
+        self.execute(
+            f"INSERT INTO {self.table} (rowid, title, content, answers) "
+            f"SELECT q.id, q.title, q.content, coalesce("
+            f"(SELECT group_concat(c.content, ' ') FROM {COMMENT_TABLE} c WHERE c.question_id = q.id), '') "
+            f"FROM {QUESTION_TABLE} q"
+        )
+
+    def prepare_query(self, query):
+        # Every word is quoted so that user input can never be parsed as FTS5 query syntax.
+        return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+    def ranked_sql(self):
+        return (
+            f"SELECT q.id, -bm25({self.table}, 10.0, 5.0, 1.0) * {LIKES_BOOST} AS score "
+            f"FROM {self.table} JOIN {QUESTION_TABLE} q ON q.id = {self.table}.rowid "
+            f"WHERE {self.table} MATCH %s"
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+def get_backend(using='default'):
+    connection = connections[using]
+    return BACKENDS.get(connection.vendor, SearchBackend)(connection)
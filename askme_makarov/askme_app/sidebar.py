@@ -0,0 +1,71 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from askme_app.models import Tag, Profile
+
+# The entry lives in the 'shared' cache, so one recomputation (or refresh_sidebar) serves every
+# worker process.
+CACHE_KEY = 'sidebar:leaderboard'
+LOCK_KEY = 'sidebar:leaderboard:lock'
+VERSION_KEY = 'sidebar:leaderboard:version'
+LOCK_TIMEOUT = 30
+TOP_N = 10
+
+EMPTY = {'tags': [], 'users': []}
+
+
+def _ttl():
+    return getattr(settings, 'SIDEBAR_CACHE_TTL', 60)
+
+
+def compute():
+    return {
+        'tags': list(Tag.manager.top_of_tags(TOP_N)),
+        'users': list(Profile.manager.get_top_users(TOP_N).select_related('user', 'stats')),
+    }
+
+
+def _digest(data):
+    # Of what the sidebar shows, so recomputing an unchanged leaderboard keeps its version.
+    shown = [tag.name for tag in data['tags']] + [profile.user.username for profile in data['users']]
+    return hashlib.md5('\n'.join(shown).encode()).hexdigest()
+
+
+def refresh():
+    data = compute()
+    # The entry outlives its TTL so that stale data can be served while one process recomputes it.
+    caches['shared'].set_many({CACHE_KEY: (time.time() + _ttl(), data), VERSION_KEY: _digest(data)},
+                              timeout=_ttl() * 10)
+    return data
+
+
+def _refresh_locked():
+    # None when another request is already recomputing.
+    shared = caches['shared']
+    if not shared.add(LOCK_KEY, True, timeout=LOCK_TIMEOUT):
+        return None
+    try:
+        return refresh()
+    finally:
+        shared.delete(LOCK_KEY)
+
+
+def get_leaderboard():
+    entry = caches['shared'].get(CACHE_KEY)
+    if entry is None:
+        # After a restart or an eviction only one request computes the aggregate; the ones arriving
+        # meanwhile render an empty sidebar rather than queue up behind it.
+        data = _refresh_locked()
+        return EMPTY if data is None else data
+    fresh_until, data = entry
+    if fresh_until < time.time():
+        data = _refresh_locked() or data
+    return data
+
+
+def version():
+    # Changes whenever what the sidebar shows does (see conditional.py), the same in every process.
+    return caches['shared'].get(VERSION_KEY, '')
@@ -0,0 +1,153 @@
+import gzip
+import mimetypes
+import os
+import re
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.utils._os import safe_join
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.ttf', '.eot')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# name.0123456789ab.ext as written by ManifestStaticFilesStorage
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def strip_css(text):
+    # Fallback without rcssmin: only drops comments (keeping /*! license */ ones) and indentation,
+    # which cannot change what the stylesheet means.
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def minify(name, text):
+    if '.min.' in name:
+        return text
+    if name.endswith('.css'):
+        return rcssmin.cssmin(text, keep_bang_comments=True) if rcssmin else strip_css(text)
+    if name.endswith('.js') and rjsmin:
+        # JavaScript is left alone without rjsmin: a regex cannot minify it safely.
+        return rjsmin.jsmin(text, keep_bang_comments=True)
+    return text
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic into STATIC_ROOT in three steps: fingerprint the collected files (content hash in
+    the name, plus the manifest), minify the hashed CSS and JS and write .gz and .br siblings of
+    them. Sizes at each step are kept in build_report for the build_static command.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.build_report = {}
+        self.missing = set()
+
+    def stored_name(self, name):
+        # Before the first build (development, tests) there is no manifest: link the plain name.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def hashed_name(self, name, content=None, filename=None):
+        # A url() in a stylesheet pointing to a file that was never shipped (the jquery-ui theme
+        # images) is already broken; leave it as it is instead of failing the whole build.
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            self.missing.add(name)
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        self.missing = set()
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # The hashed copies are written from the source files, so minifying happens on them. The
+        # hash is still that of the source: the same source always minifies to the same bytes.
+        self.build_report = {}
+        for name, hashed_name in self.hashed_files.items():
+            if name in paths:
+                self.build_report[name] = self._minify(hashed_name)
+                self.build_report[name].update(self._precompress(hashed_name))
+
+    def _minify(self, name):
+        path = self.path(name)
+        size = os.path.getsize(path)
+        sizes = {'original': size, 'minified': size}
+        if name.endswith(('.css', '.js')):
+            with open(path, 'rb') as f:
+                try:
+                    minified = minify(name, f.read().decode('utf-8')).encode('utf-8')
+                except UnicodeDecodeError:
+                    return sizes
+            if len(minified) < size:
+                with open(path, 'wb') as f:
+                    f.write(minified)
+                sizes['minified'] = len(minified)
+        return sizes
+
+    def _precompress(self, name):
+        sizes = {}
+        if not name.endswith(COMPRESSIBLE):
+            return sizes
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+                sizes[suffix] = len(compressed)
+        return sizes
+
+
+def serve_precompressed(request, name):
+    """Response for a file of STATIC_ROOT in the best encoding the client accepts, or None."""
+    try:
+        path = safe_join(settings.STATIC_ROOT, unquote(name))
+    except SuspiciousFileOperation:
+        return None
+    if not os.path.isfile(path):
+        return None
+
+    accepted = {part.split(';')[0].strip() for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    encoding, served = None, path
+    for candidate, suffix in ENCODINGS:
+        if candidate in accepted and os.path.isfile(path + suffix):
+            encoding, served = candidate, path + suffix
+            break
+
+    response = FileResponse(open(served, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    # Fingerprinted names change with their content, so they never need revalidating.
+    response['Cache-Control'] = IMMUTABLE if HASHED_NAME.search(name) else 'public, max-age=3600'
+    return response
@@ -0,0 +1,82 @@
+import bisect
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count
+
+from askme_app.models import Tag
+
+TAG_NAME_LENGTH = Tag._meta.get_field('name').max_length
+
+
+class TagPrefixIndex:
+    """
+    In-process autocomplete index: tag names kept sorted by their lowercase form, so the tags starting
+    with a prefix are one bisect range, ranked by how many questions use them. Tags differing only in
+    case stay apart. Answers are memoized for the TAG_INDEX_MEMO_SIZE most recently asked prefixes
+    until the index changes. The index is reloaded from the database after TAG_INDEX_TTL seconds to
+    pick up tags created by other processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (lowercase name, name), sorted
+        self._keys = []
+        self._counts = {}
+        self._memo = OrderedDict()
+        self._loaded_at = None
+
+    def _ttl(self):
+        return getattr(settings, 'TAG_INDEX_TTL', 300)
+
+    def load(self):
+        rows = Tag.manager.annotate(num_questions=Count('questions')).values_list('name', 'num_questions')
+        counts = dict(rows)
+        with self._lock:
+            self._counts = counts
+            self._keys = sorted((name.lower(), name) for name in counts)
+            self._memo = OrderedDict()
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self._ttl():
+            self.load()
+
+    def add(self, names):
+        """Counts one more question for each of the names, inserting the tags that are new."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for name in names:
+                if name in self._counts:
+                    self._counts[name] += 1
+                else:
+                    self._counts[name] = 1
+                    bisect.insort(self._keys, (name.lower(), name))
+            self._memo = OrderedDict()
+
+    def suggest(self, prefix, limit=10):
+        prefix = prefix.strip().lower()
+        # The term comes from the client: longer than any tag name it cannot match anything, and it
+        # must not be memoized either.
+        if len(prefix) > TAG_NAME_LENGTH:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            memo_key = (prefix, limit)
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                return self._memo[memo_key]
+            start = bisect.bisect_left(self._keys, (prefix,))
+            end = bisect.bisect_left(self._keys, (prefix + '\U0010ffff',), start)
+            best = heapq.nlargest(limit, self._keys[start:end], key=lambda key: self._counts[key[1]])
+            names = self._memo[memo_key] = [name for _, name in best]
+            if len(self._memo) > getattr(settings, 'TAG_INDEX_MEMO_SIZE', 1000):
+                self._memo.popitem(last=False)
+            return names
+
+
+tag_index = TagPrefixIndex()
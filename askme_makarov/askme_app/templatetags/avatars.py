@@ -0,0 +1,30 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from askme_app.avatars import DENSITIES, SIZES, thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(profile, size, css_class=''):
+    """
+    <picture> with WebP and JPEG thumbnails of the profile's avatar for 1x and 2x screens, or the
+    default picture while there is none (or it is still being processed).
+    """
+    pixels = SIZES[size]
+    avatar_hash = getattr(profile, 'avatar_hash', '')
+    if not avatar_hash:
+        return format_html('<img alt="" class="{}" src="{}" width="{}" height="{}">',
+                           css_class, static('img/css_ava.svg'), pixels, pixels)
+
+    def srcset(extension):
+        return ', '.join(f'{thumbnail_url(avatar_hash, pixels * density, extension)} {density}x'
+                         for density in DENSITIES)
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img alt="" class="{}" src="{}" srcset="{}" width="{}" height="{}" loading="lazy"></picture>',
+        srcset('webp'), css_class, thumbnail_url(avatar_hash, pixels, 'jpg'), srcset('jpg'), pixels, pixels
+    )
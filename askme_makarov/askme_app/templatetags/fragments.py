@@ -0,0 +1,31 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@register.simple_tag
+def cached_items(items, template_name, name):
+    """
+    Renders template_name once per item (available in it as ``name``) and caches each piece of HTML
+    under the item's id and fragment_version. All fragments of the page are fetched with one
+    get_many() and only the missing ones are rendered.
+    """
+    items = list(items)
+    item_template = get_template(template_name)
+    if not getattr(settings, 'FRAGMENT_CACHE_ENABLED', True):
+        return mark_safe(''.join(item_template.render({name: item}) for item in items))
+
+    keys = [f'fragment:{name}:{item.pk}:{item.fragment_version}' for item in items]
+    found = cache.get_many(keys)
+    rendered = {}
+    for item, key in zip(items, keys):
+        if key not in found:
+            rendered[key] = item_template.render({name: item})
+    if rendered:
+        cache.set_many(rendered, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600))
+        found.update(rendered)
+    return mark_safe(''.join(found[key] for key in keys))
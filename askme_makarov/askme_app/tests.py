@@ -1,3 +1,1065 @@
-from django.test import TestCase
+import contextvars
+import gzip
+import importlib
+import io
+import tempfile
+import re
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone as django_timezone
+
+from askme_app import avatars, checks, jobs, metrics, page_cache, search, sidebar, throttle
+from askme_app.db_routers import PIN_COOKIE, PinToPrimaryMiddleware, PrimaryReplicaRouter
+from askme_app.tag_index import TagPrefixIndex, tag_index
+from PIL import Image
+from askme_app.forms import AskForm
+from askme_app.models import Job, Profile, ProfileStats, Question, QuestionLike, Tag, Comment, CommentLike, reputation
+from askme_app.paginators import CursorPaginator, InvalidCursor, encode_cursor
 
 # Create your tests here.
+
+# Tests that use the 'shared' cache get an in-memory one, so that running them leaves the
+# throttle buckets and page versions of the development server (settings.CACHES) alone.
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ListingQueryCountTest(TestCase):
+    # One query for the page rows with authors and one for the tags of the whole page, plus the tag
+    # lookup on /tag/<name>.
+    QUERIES = {'index': 2, 'hot': 2, 'tag': 3}
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='author')
+        self.profile = Profile.manager.create(user=user)
+        self.tags = Tag.manager.bulk_create([Tag(name=f'tag{i}') for i in range(3)])
+
+    def add_questions(self, n):
+        for i in range(n):
+            question = Question.manager.create(author=self.profile, title=f'Question {i}', content='Text')
+            question.tags.set(self.tags[:i % 3 + 1])
+
+    def get_urls(self):
+        return {
+            'index': reverse('index'),
+            'hot': reverse('hot'),
+            'tag': reverse('tag', kwargs={'tag_name': 'tag0'}),
+        }
+
+    def assert_page_queries(self):
+        sidebar.refresh()
+        for name, url in self.get_urls().items():
+            with self.assertNumQueries(self.QUERIES[name]):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_small_page(self):
+        self.add_questions(2)
+        self.assert_page_queries()
+
+    def test_full_page(self):
+        self.add_questions(45)
+        self.assert_page_queries()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='author')
+        profile = Profile.manager.create(user=user)
+        cls.questions = Question.manager.bulk_create([
+            Question(author=profile, title=f'Question {i}', content='Text') for i in range(10)
+        ])
+        # Ties on the first key: every question was asked at one of two moments.
+        first, second = django_timezone.now() - timedelta(hours=1), django_timezone.now()
+        for i, question in enumerate(cls.questions):
+            Question.manager.filter(pk=question.pk).update(create_date=first if i < 4 else second)
+        cls.expected = list(Question.manager.get_new_questions().values_list('id', flat=True))
+
+    def ids(self, page):
+        return [question.id for question in page]
+
+    def test_pages_forward_and_back(self):
+        paginator = CursorPaginator(Question.manager.get_new_questions(), 3)
+        pages = [paginator.page()]
+        self.assertFalse(pages[0].has_previous())
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual(sum((self.ids(page) for page in pages), []), self.expected)
+
+        for i in range(len(pages) - 1, 0, -1):
+            self.assertEqual(self.ids(paginator.page(pages[i].previous_cursor)), self.ids(pages[i - 1]))
+
+    def test_short_walk_back_serves_the_first_page(self):
+        paginator = CursorPaginator(Question.manager.get_new_questions(), 3)
+        # One item before the cursor: a full first page instead of a page of one.
+        shifted = paginator.page(encode_cursor('p', paginator._key_values(paginator.page().object_list[1])))
+        self.assertEqual(self.ids(shifted), self.expected[:3])
+        self.assertFalse(shifted.has_previous())
+
+    def test_invalid_cursors(self):
+        paginator = CursorPaginator(Question.manager.get_new_questions(), 3)
+        for cursor in ['garbage', encode_cursor('x', []), encode_cursor('n', ['2024-01-01T00:00:00+00:00']),
+                       encode_cursor('n', ['not a date', 1])]:
+            with self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+        response = self.client.get(reverse('index'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(response.context['questions']), self.expected[:10])
+
+    def test_deep_page_seeks_the_index(self):
+        paginator = CursorPaginator(Question.manager.get_new_questions(), 3)
+        plan = paginator._query(paginator.page().next_cursor)[0].explain()
+        if connection.vendor == 'sqlite':
+            self.assertRegex(plan, r'SEARCH askme_app_question USING (COVERING )?INDEX question_new_idx \(create_date<\?\)')
+        elif connection.vendor == 'postgresql':
+            self.assertRegex(plan, r'Index Cond: \(create_date <=')
+
+
+class SearchTest(TestCase):
+    # Runs against the backend of the test database: FTS5 on SQLite, tsvector on PostgreSQL.
+
+    def setUp(self):
+        if search.get_backend().ranked_sql() is None:
+            self.skipTest(f'No full-text search on {connection.vendor}')
+        self.profile = Profile.manager.create(user=User.objects.create(username='author'))
+
+    def ask(self, title, content='Nothing to see here', likes=0, answers=()):
+        question = Question.manager.create(author=self.profile, title=title, content=content, likes_count=likes)
+        Comment.manager.bulk_create([Comment(author=self.profile, question=question, content=answer) for answer in answers])
+        return question
+
+    def ids(self, query, cursor=None, per_page=20):
+        return [question.id for question in Question.manager.search(query, cursor, per_page)]
+
+    def test_ranks_title_over_content_over_answers(self):
+        in_answer = self.ask('Dinner question', answers=['Make borscht'])
+        in_content = self.ask('Soup question', 'How do I cook borscht')
+        in_title = self.ask('Borscht recipe')
+        self.ask('Unrelated question')
+        Question.manager.rebuild_search_index()
+        self.assertEqual(self.ids('borscht'), [in_title.id, in_content.id, in_answer.id])
+        self.assertEqual(self.ids('pelmeni'), [])
+        # Query syntax of the backend is taken as plain words.
+        self.assertEqual(self.ids('"borscht*'), [in_title.id, in_content.id, in_answer.id])
+
+    def test_likes_break_ties(self):
+        plain = self.ask('Borscht recipe')
+        liked = self.ask('Borscht recipe', likes=50)
+        Question.manager.rebuild_search_index()
+        self.assertEqual(self.ids('borscht'), [liked.id, plain.id])
+
+    def test_cursor_pages(self):
+        questions = [self.ask('Borscht recipe', likes=i) for i in range(5)]
+        Question.manager.rebuild_search_index()
+        expected = [question.id for question in reversed(questions)]
+        self.assertEqual(self.ids('borscht'), expected)
+
+        pages = [Question.manager.search('borscht', per_page=2)]
+        while pages[-1].has_next():
+            pages.append(Question.manager.search('borscht', pages[-1].next_cursor, per_page=2))
+        self.assertEqual([[question.id for question in page] for page in pages], [expected[:2], expected[2:4], expected[4:]])
+        self.assertEqual(self.ids('borscht', pages[2].previous_cursor, per_page=2), expected[2:4])
+        with self.assertRaises(InvalidCursor):
+            Question.manager.search('borscht', encode_cursor('n', ['high', 'id']))
+
+    def test_fill_db_indexes_its_questions(self):
+        call_command('fill_db', 1, stdout=io.StringIO(), stderr=io.StringIO())
+        question = Question.manager.order_by('id').first()
+        word = max(re.findall(r'\w+', question.title), key=len)
+        self.assertIn(question.id, self.ids(word, per_page=100))
+
+
+class ExportImportTest(TestCase):
+    def snapshot(self):
+        # Everything but the ids, which the import renumbers.
+        questions = Question.manager.annotate(username=F('author__user__username')).order_by('pk')
+        return {
+            'users': sorted(User.objects.values_list('username', 'password', 'email', 'date_joined')),
+            'tags': sorted(Tag.manager.values_list('name', flat=True)),
+            'questions': [(q.username, q.title, q.content, q.create_date, q.likes_count, q.answers_count,
+                           q.hot_score, sorted(tag.name for tag in q.tags.all())) for q in questions],
+            'comments': sorted(Comment.manager.values_list('question__title', 'author__user__username', 'content',
+                                                           'create_date', 'is_correct', 'likes_count')),
+            'question_likes': sorted(QuestionLike.objects.values_list('question__title', 'author__user__username')),
+            'comment_likes': sorted(CommentLike.objects.values_list('comment__content', 'author__user__username')),
+            'stats': sorted(ProfileStats.manager.values_list('profile__user__username', 'reputation')),
+        }
+
+    def test_round_trip(self):
+        call_command('fill_db', 2, stdout=io.StringIO(), stderr=io.StringIO())
+        before = self.snapshot()
+        self.assertTrue(before['comment_likes'] or before['question_likes'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/qa.jsonl.gz'
+            call_command('export_qa', path, stdout=io.StringIO(), stderr=io.StringIO())
+            User.objects.all().delete()
+            Tag.manager.all().delete()
+            self.assertEqual(Question.manager.count(), 0)
+            call_command('import_qa', path, '--batch-size', '7', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+        question = Question.manager.order_by('id').first()
+        word = max(re.findall(r'\w+', question.title), key=len)
+        self.assertIn(question.id, [found.id for found in Question.manager.search(word, per_page=100)])
+
+
+class FillDbTest(TestCase):
+    def test_can_run_again_with_the_same_seed(self):
+        for _ in range(2):
+            call_command('fill_db', 1, '--seed', '1', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Question.manager.count(), 20)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ViewQueryBudgetTest(TestCase):
+    """
+    Query budget of every GET page with a cold page cache and a warm sidebar and tag index, the same
+    numbers the bench command reports as queries per request. Logged in pages that look at the user
+    also load the user; the session comes from the cache and request.profile from the session.
+    """
+    ANONYMOUS = {'index': 2, 'hot': 2, 'tag': 3, 'question': 4, 'search': 3, 'tag_autocomplete': 0,
+                 'login': 0, 'signup': 0}
+    LOGGED_IN = {'index': 3, 'hot': 3, 'tag': 4, 'question': 5, 'search': 4, 'tag_autocomplete': 0,
+                 'ask': 1, 'settings': 1}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='secret')
+        profile = Profile.manager.create(user=self.user)
+        tags = Tag.manager.bulk_create([Tag(name=f'tag{i}') for i in range(3)])
+        for i in range(25):
+            question = Question.manager.create(author=profile, title=f'Question {i}', content='Text')
+            question.tags.set(tags[:i % 3 + 1])
+            Question.manager.index_for_search(question)
+        self.question = question
+        for i in range(35):
+            Comment.manager.create_comment(f'Answer {i}', profile, question)
+        sidebar.refresh()
+        tag_index.load()
+
+    def get_urls(self):
+        return {
+            'index': reverse('index'),
+            'hot': reverse('hot'),
+            'tag': reverse('tag', kwargs={'tag_name': 'tag0'}),
+            'question': reverse('question', kwargs={'question_id': self.question.id}),
+            'search': reverse('search') + '?q=question',
+            'tag_autocomplete': reverse('tag_autocomplete') + '?term=ta',
+            'ask': reverse('ask'),
+            'settings': reverse('settings'),
+            'login': reverse('login'),
+            'signup': reverse('signup'),
+        }
+
+    def assert_budgets(self, budgets):
+        urls = self.get_urls()
+        for name, budget in budgets.items():
+            with self.subTest(view=name), self.assertNumQueries(budget):
+                response = self.client.get(urls[name])
+                self.assertEqual(response.status_code, 200)
+
+    def test_anonymous(self):
+        self.assert_budgets(self.ANONYMOUS)
+
+    def test_logged_in(self):
+        self.client.force_login(self.user)
+        # The first page after logging in loads the profile and saves it in the session.
+        self.client.get(reverse('ask'))
+        self.assert_budgets(self.LOGGED_IN)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LikeEndpointTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='liker', password='secret')
+        self.profile = Profile.manager.create(user=self.user)
+        self.question = Question.manager.create(author=self.profile, title='Question', content='Text')
+        self.url = reverse('like_question', kwargs={'question_id': self.question.id})
+
+    def test_requires_login(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 401)
+
+    def test_toggle_returns_new_count(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(self.url).json(), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.client.post(self.url).json(), {'liked': False, 'likes_count': 0})
+        self.assertEqual(QuestionLike.objects.count(), 0)
+
+    def test_like_pins_client_to_primary(self):
+        self.client.force_login(self.user)
+        # Saving request.profile in the session is a write too; later pages only read.
+        self.client.get(reverse('index'))
+        self.assertNotIn(PIN_COOKIE, self.client.get(reverse('hot')).cookies)
+        self.assertIn(PIN_COOKIE, self.client.post(self.url).cookies)
+
+
+class CounterDriftTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}', password='secret') for i in range(3)]
+        self.profiles = [Profile.manager.create(user=user) for user in self.users]
+        self.question = Question.manager.create(author=self.profiles[0], title='Question', content='Text')
+
+    def counters(self):
+        return (list(Question.manager.order_by('pk').values_list('likes_count', 'answers_count', 'hot_score')),
+                list(Comment.manager.order_by('pk').values_list('likes_count', flat=True)))
+
+    def test_incremental_counters_match_recount(self):
+        answers = [Comment.manager.create_comment(f'Answer {i}', profile, self.question)
+                   for i, profile in enumerate(self.profiles[1:])]
+        question_url = reverse('like_question', kwargs={'question_id': self.question.id})
+        answer_url = reverse('like_comment', kwargs={'comment_id': answers[0].id})
+        for user in self.users:
+            self.client.force_login(user)
+            self.client.post(question_url)
+            self.client.post(answer_url)
+        # An unlike, and a like toggled twice, must cancel out.
+        self.client.post(question_url)
+        self.client.force_login(self.users[0])
+        self.client.post(answer_url)
+        self.client.post(answer_url)
+
+        incremental = self.counters()
+        self.assertEqual(incremental[0][0][:2], (2, 2))
+        self.assertEqual(incremental[1], [3, 0])
+        Question.manager.recount_counters()
+        Comment.manager.recount_counters()
+        Question.manager.rebuild_hot_scores()
+        self.assertEqual(self.counters(), incremental)
+
+
+@override_settings(TAG_INDEX_MEMO_SIZE=3)
+class TagPrefixIndexTest(TestCase):
+    def setUp(self):
+        profile = Profile.manager.create(user=User.objects.create(username='author'))
+        tags = {name: Tag.manager.create(name=name) for name in ['python', 'Python', 'pytest', 'django', 'pyramid']}
+        for i, names in enumerate([['python', 'pytest'], ['python', 'Python'], ['python'], ['pytest'], ['django']]):
+            question = Question.manager.create(author=profile, title=f'Question {i}', content='Text')
+            question.tags.set([tags[name] for name in names])
+        self.index = TagPrefixIndex()
+
+    def test_ranked_by_questions(self):
+        # Ties keep alphabetical order; tags differing in case are both suggested.
+        self.assertEqual(self.index.suggest('py'), ['python', 'pytest', 'Python', 'pyramid'])
+        self.assertEqual(self.index.suggest(' PY ', limit=2), ['python', 'pytest'])
+        self.assertEqual(self.index.suggest('dj'), ['django'])
+        self.assertEqual(self.index.suggest('x'), [])
+
+    def test_add(self):
+        self.index.suggest('py')
+        self.index.add(['pyramid', 'pyramid', 'pyramid', 'pydantic'])
+        self.assertEqual(self.index.suggest('py'), ['pyramid', 'python', 'pytest', 'pydantic', 'Python'])
+
+    def test_memo_is_bounded(self):
+        for term in ['a', 'b', 'c', 'd', 'e', 'x' * 1000]:
+            self.index.suggest(term)
+        self.assertEqual(list(self.index._memo), [('c', 10), ('d', 10), ('e', 10)])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SidebarTest(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        profile = Profile.manager.create(user=User.objects.create(username='author'))
+        self.question = Question.manager.create(author=profile, title='Question', content='Text')
+        self.question.tags.add(Tag.manager.create(name='old'))
+
+    def tag_names(self):
+        return [tag.name for tag in sidebar.get_leaderboard()['tags']]
+
+    def test_refresh_reaches_other_processes(self):
+        self.assertEqual(self.tag_names(), ['old'])
+        self.question.tags.add(Tag.manager.create(name='new'))
+        call_command('refresh_sidebar', stdout=io.StringIO())
+        # Another worker process: a default cache of its own, the same shared one.
+        with override_settings(CACHES={**TEST_CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'another-process',
+        }}):
+            with self.assertNumQueries(0):
+                self.assertEqual(sorted(self.tag_names()), ['new', 'old'])
+
+    def test_one_request_computes_a_missing_leaderboard(self):
+        caches['shared'].add(sidebar.LOCK_KEY, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(sidebar.get_leaderboard(), sidebar.EMPTY)
+        caches['shared'].delete(sidebar.LOCK_KEY)
+        self.assertEqual(self.tag_names(), ['old'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tag_names(), ['old'])
+
+    def test_stale_data_is_served_while_another_request_recomputes(self):
+        caches['shared'].set(sidebar.CACHE_KEY, (0, sidebar.compute()))
+        self.question.tags.add(Tag.manager.create(name='new'))
+        caches['shared'].add(sidebar.LOCK_KEY, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tag_names(), ['old'])
+        caches['shared'].delete(sidebar.LOCK_KEY)
+        self.assertEqual(sorted(self.tag_names()), ['new', 'old'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        sidebar.refresh()
+        self.profile = Profile.manager.create(user=User.objects.create(username='author'))
+        self.question = Question.manager.create(author=self.profile, title='Question', content='Text')
+        self.url = reverse('question', kwargs={'question_id': self.question.id})
+        self.initial = self.counts()
+
+    def counts(self):
+        return metrics.page_cache_hits_total.values.get((), 0), metrics.page_cache_misses_total.values.get((), 0)
+
+    def assert_stats(self, hits, misses):
+        # The counters belong to the process, so only what this test added counts.
+        self.assertEqual(tuple(now - before for now, before in zip(self.counts(), self.initial)), (hits, misses))
+
+    def test_hit_after_miss(self):
+        first = self.client.get(self.url)
+        # Only the last activity of conditional GET is queried.
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assert_stats(hits=1, misses=1)
+        self.client.force_login(self.profile.user)
+        self.client.get(self.url)
+        self.assert_stats(hits=1, misses=1)
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_counts_are_exported(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        hits, misses = self.counts()
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(f'askme_page_cache_hits_total {hits}\n', body)
+        self.assertIn(f'askme_page_cache_misses_total {misses}\n', body)
+
+    def test_answer_invalidates_question_and_listings(self):
+        self.client.get(self.url)
+        self.client.get(reverse('index'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.manager.create_comment('Fresh answer', self.profile, self.question)
+        self.assertContains(self.client.get(self.url), 'Fresh answer')
+        self.client.get(reverse('index'))
+        self.assert_stats(hits=0, misses=4)
+
+    def test_like_invalidates_question(self):
+        comment = Comment.manager.create_comment('Answer', self.profile, self.question)
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            CommentLike.objects.toggle_like(self.profile, comment)
+        self.assertContains(self.client.get(self.url), '<span class="text-success mx-1 likes-count">1</span>', html=True)
+        self.assert_stats(hits=0, misses=2)
+
+    def test_write_in_another_process_invalidates(self):
+        self.client.get(self.url)
+        # Another worker process: a default cache of its own, the same shared one.
+        with override_settings(CACHES={**TEST_CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'another-process',
+        }}):
+            page_cache.bump(page_cache.question_scope(self.question.id))
+        self.client.get(self.url)
+        self.assert_stats(hits=0, misses=2)
+
+
+class FragmentCacheTest(TestCase):
+    TEMPLATE = Template("{% load fragments %}{% cached_items questions 'components/question-item.html' 'question' %}")
+
+    def setUp(self):
+        cache.clear()
+        self.profile = Profile.manager.create(user=User.objects.create(username='author'))
+        self.questions = [Question.manager.create(author=self.profile, title=f'Question {i}', content='Text')
+                          for i in range(2)]
+
+    def render(self):
+        questions = Question.manager.select_related('author').order_by('pk')
+        return self.TEMPLATE.render(Context({'questions': questions}))
+
+    def test_fragments_are_reused_until_their_version_changes(self):
+        self.assertIn('Question 0', self.render())
+        # Titles never change after asking, so a changed title shows whether a fragment was rendered again.
+        Question.manager.update(title='Renamed')
+        self.assertEqual(self.render().count('Question '), 2)
+
+        QuestionLike.objects.toggle_like(self.profile, self.questions[0])
+        html = self.render()
+        self.assertIn('Question 1', html)
+        self.assertNotIn('Question 0', html)
+        self.assertIn('<span class="text-success mx-1 likes-count">1</span>', html)
+
+        Profile.manager.filter(pk=self.profile.pk).update(avatar_hash='a' * 32)
+        self.assertNotIn('Question ', self.render())
+
+    @override_settings(FRAGMENT_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.render()
+        Question.manager.update(title='Renamed')
+        self.assertNotIn('Question ', self.render())
+        self.assertEqual(cache.get_many([f'fragment:question:{q.pk}:{q.fragment_version}' for q in self.questions]), {})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LiveUpdatesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        profile = Profile.manager.create(user=User.objects.create(username='author'))
+        self.question = Question.manager.create(author=profile, title='Question', content='Text')
+        self.url = reverse('question', kwargs={'question_id': self.question.id})
+        self.events_url = reverse('question_events', kwargs={'question_id': self.question.id})
+
+    def test_off_by_default(self):
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'data-events-url')
+        self.assertNotContains(response, 'js/live.js')
+        self.assertEqual(self.client.get(self.events_url).status_code, 404)
+
+    @override_settings(LIVE_UPDATES_ENABLED=True)
+    def test_enabled_under_asgi(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, f'data-events-url="{self.events_url}"')
+        self.assertContains(response, 'js/live.js')
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    # Runs against the 'replica' alias of settings.py, which mirrors default in tests.
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def route(self, func):
+        # The pin lives in a context variable; a fresh context keeps it from leaking between tests.
+        return contextvars.Context().run(func)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.route(lambda: self.router.db_for_read(Question)), 'replica')
+        self.assertEqual(self.route(lambda: self.router.db_for_write(Question)), 'default')
+
+    def test_reads_after_write_go_to_primary(self):
+        def write_then_read():
+            self.router.db_for_write(QuestionLike)
+            return self.router.db_for_read(Question)
+        self.assertEqual(self.route(write_then_read), 'default')
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.route(lambda: self.router.db_for_read(Question)), 'default')
+
+    def test_pin_cookie(self):
+        read = PinToPrimaryMiddleware(lambda request: HttpResponse(self.router.db_for_read(Question)))
+        write = PinToPrimaryMiddleware(lambda request: HttpResponse(self.router.db_for_write(Question)))
+        request = RequestFactory().get('/')
+        self.assertEqual(self.route(lambda: read(request)).content, b'replica')
+        response = self.route(lambda: write(request))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request.COOKIES[PIN_COOKIE] = '1'
+        response = self.route(lambda: read(request))
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AsgiMiddlewareTest(TestCase):
+    @override_settings(DEBUG=True)
+    def test_middleware_chain_is_not_adapted(self):
+        # Django logs every middleware it has to run in a thread for the async handler.
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_async_requests(self):
+        cache.clear()
+        user = await sync_to_async(User.objects.create_user)(username='liker', password='secret')
+        profile = await Profile.manager.acreate(user=user)
+        question = await Question.manager.acreate(author=profile, title='Question', content='Text')
+
+        response = await self.async_client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.async_client.post(reverse('like_question', kwargs={'question_id': question.id}))
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AsyncReadViewsTest(TransactionTestCase):
+    # The async views run some queries on other threads, so the data has to be committed. Pages
+    # read from the replica, which mirrors default in tests.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='asker', password='secret')
+        asker = Profile.manager.create(user=self.user)
+        answerer = Profile.manager.create(user=User.objects.create(username='answerer'))
+        for i in range(3):
+            form = AskForm({'title': f'Question {i}', 'content': 'Text', 'tags': f'tag0,tag{i + 1}'}, author=asker)
+            self.assertTrue(form.is_valid())
+            question = form.save()
+            comment = Comment.manager.create_comment(f'Answer {i}', answerer, question)
+            QuestionLike.objects.toggle_like(answerer, question)
+            CommentLike.objects.toggle_like(asker, comment)
+        self.urls = [reverse('index'), reverse('hot'), reverse('tag', kwargs={'tag_name': 'tag0'}),
+                     reverse('question', kwargs={'question_id': question.id})]
+
+    def tearDown(self):
+        self.use_async_views(settings.ASYNC_READ_VIEWS)
+
+    def use_async_views(self, enabled):
+        # urls.py picks the views when it is imported.
+        with override_settings(ASYNC_READ_VIEWS=enabled):
+            importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def pages(self, get):
+        pages = []
+        for url in self.urls:
+            # Neither may be served the page the other one cached.
+            cache.clear()
+            response = get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(re.sub(r'name="csrfmiddlewaretoken" value="\w+"', '', response.content.decode()))
+        return pages
+
+    def test_same_pages_as_sync_views(self):
+        self.use_async_views(False)
+        anonymous = self.pages(self.client.get)
+        self.client.force_login(self.user)
+        logged_in = self.pages(self.client.get)
+
+        self.use_async_views(True)
+        self.assertEqual(self.pages(async_to_sync(self.async_client.get)), anonymous)
+        self.async_client.force_login(self.user)
+        self.assertEqual(self.pages(async_to_sync(self.async_client.get)), logged_in)
+        self.assertIn('Question 2', anonymous[2])
+        self.assertIn('Answer 2', logged_in[3])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentLikeToggleTest(TransactionTestCase):
+    THREADS = 8
+    TOGGLES = 5
+
+    def setUp(self):
+        user = User.objects.create(username='liker')
+        self.profile = Profile.manager.create(user=user)
+        self.question = Question.manager.create(author=self.profile, title='Question', content='Text')
+
+    def hammer(self, barrier, errors):
+        barrier.wait()
+        try:
+            for _ in range(self.TOGGLES):
+                for attempt in range(50):
+                    try:
+                        QuestionLike.objects.toggle_like(self.profile, self.question)
+                        break
+                    except OperationalError as e:
+                        # SQLite reports a locked database instead of waiting for the other writer.
+                        locked = e
+                        time.sleep(0.01)
+                else:
+                    # A lost toggle would leave the final count right half of the time.
+                    errors.append(locked)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_toggle_from_many_threads(self):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+        threads = [threading.Thread(target=self.hammer, args=(barrier, errors)) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        likes = QuestionLike.objects.filter(question=self.question).count()
+        self.assertEqual(likes, self.THREADS * self.TOGGLES % 2)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.likes_count, likes)
+
+
+class QueryPlanTest(TestCase):
+    """
+    EXPLAINs the queries of the managers in models.py and fails on an unbounded scan (full or of a
+    whole index) or a sort of a table that grows with the site. PostgreSQL prefers sequential scans on a small test database, so they
+    are priced out first; whatever still scans or sorts has no index to use instead.
+    The sidebar's top_of_tags reads whole tables by design and is cached.
+    """
+    LARGE_TABLES = ['askme_app_question', 'askme_app_comment', 'askme_app_questionlike', 'askme_app_commentlike',
+                    'askme_app_question_tags', 'askme_app_profile', 'askme_app_profilestats', 'auth_user']
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(20)])
+        profiles = Profile.manager.bulk_create([Profile(user=user) for user in users])
+        tags = Tag.manager.bulk_create([Tag(name=f'tag{i}') for i in range(10)])
+        questions = Question.manager.bulk_create([
+            Question(author=profiles[i % 20], title=f'Question {i}', content='Text', likes_count=i % 7)
+            for i in range(200)
+        ])
+        Question.tags.through.objects.bulk_create([
+            Question.tags.through(question_id=question.id, tag_id=tags[(i + k) % 10].id)
+            for i, question in enumerate(questions) for k in range(2)
+        ])
+        comments = Comment.manager.bulk_create([
+            Comment(author=profiles[i % 20], question=questions[i % 10], content='Answer', likes_count=i % 5)
+            for i in range(400)
+        ])
+        QuestionLike.objects.bulk_create([QuestionLike(author=profiles[i % 20], question=questions[i]) for i in range(100)])
+        CommentLike.objects.bulk_create([CommentLike(author=profiles[i % 20], comment=comments[i]) for i in range(100)])
+        ProfileStats.manager.rebuild()
+        cls.question, cls.comment, cls.profile = questions[0], comments[0], profiles[0]
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+        return queryset.explain()
+
+    def unbounded_scans(self, plan):
+        # (table, index) of every read of a table that no index condition bounds; index is None for a
+        # full scan. A bounded read is a SQLite SEARCH or a PostgreSQL index scan with an Index Cond.
+        if connection.vendor == 'postgresql':
+            scans = []
+            for node in plan.split('->  '):
+                full = re.match(r'\s*Seq Scan on (\w+)', node)
+                walk = re.match(r'\s*Index (?:Only )?Scan(?: Backward)? using (\w+) on (\w+)', node)
+                if full:
+                    scans.append((full.group(1), None))
+                elif walk and 'Index Cond:' not in node:
+                    scans.append((walk.group(2), walk.group(1)))
+            return scans
+        return re.findall(r'\bSCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?', plan)
+
+    def assert_indexed(self, queryset, allow_sort=False, walks=()):
+        """
+        walks names the indexes a query may read from the start without a bound, as the first page
+        of a listing does: the LIMIT stops the walk after a page. Any other scan of a large table,
+        by index or not, costs in proportion to the table.
+        """
+        plan = self.explain(queryset)
+        for table, index in self.unbounded_scans(plan):
+            if table in self.LARGE_TABLES and (index or None) not in walks:
+                self.fail(f'Unbounded scan of {table}' + (f' using {index}' if index else '') + f':\n{plan}')
+        if not allow_sort:
+            sort = re.search(r'(^|->  )Sort\b', plan, re.M) or re.search(r'USE TEMP B-TREE', plan)
+            self.assertIsNone(sort, f'Sort without an index:\n{plan}')
+
+    def assert_pages_indexed(self, queryset, per_page=20, index=None):
+        # The first page may walk the listing's index; the pages after a cursor must seek into it.
+        paginator = CursorPaginator(queryset, per_page)
+        self.assert_indexed(paginator._query(None)[0], walks=[index])
+        self.assert_indexed(paginator._query(paginator.page().next_cursor)[0])
+
+    def test_new_questions(self):
+        self.assert_pages_indexed(Question.manager.for_listing(Question.manager.get_new_questions()), index='question_new_idx')
+
+    def test_top_questions(self):
+        self.assert_pages_indexed(Question.manager.for_listing(Question.manager.get_top_questions()),
+                                  index='question_hot_score_idx')
+
+    def test_questions_by_tag(self):
+        # The sort only sees the questions of one tag, found through the tag_id index.
+        self.assert_indexed(Tag.manager.filter(name='tag0'))
+        self.assert_indexed(Question.manager.for_listing(Tag.manager.get_questions_by_tag('tag0'))[:21], allow_sort=True)
+
+    def test_comments_ordered_by_likes(self):
+        self.assert_pages_indexed(Comment.manager.get_comments_ordered_by_likes(self.question.id), per_page=30)
+
+    def test_top_users(self):
+        self.assert_indexed(Profile.manager.get_top_users(10).select_related('user', 'stats'),
+                            walks=['profile_stats_reputation_idx'])
+
+    def test_lookups_by_id(self):
+        self.assert_indexed(Question.manager.filter(pk=self.question.id))
+        self.assert_indexed(Profile.manager.filter(user_id=self.profile.user_id))
+        self.assert_indexed(User.objects.filter(pk=self.profile.user_id))
+
+    def test_like_toggle_lookups(self):
+        self.assert_indexed(QuestionLike.objects.filter(author_id=self.profile.id, question_id=self.question.id))
+        self.assert_indexed(CommentLike.objects.filter(author_id=self.profile.id, comment_id=self.comment.id))
+
+
+class AvatarPipelineTest(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 900), 'red').save(buffer, 'JPEG')
+        user = User.objects.create(username='photographer')
+        self.profile = Profile.manager.create(
+            user=user, avatar=SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+        )
+
+    def test_thumbnails(self):
+        avatar_hash = avatars.process(self.profile.id)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar_hash, avatar_hash)
+        for pixels in avatars.pixel_sizes():
+            for extension in avatars.FORMATS:
+                with default_storage.open(avatars.thumbnail_name(avatar_hash, pixels, extension)) as f:
+                    self.assertEqual(Image.open(f).size, (pixels, pixels))
+
+        html = Template("{% load avatars %}{% avatar profile 'medium' %}").render(Context({'profile': self.profile}))
+        self.assertIn(avatars.thumbnail_name(avatar_hash, 200, 'webp'), html)
+        self.assertIn('width="100"', html)
+
+    def test_upload_is_processed_by_a_job(self):
+        avatars.schedule(self.profile.id)
+        self.assertEqual(Profile.manager.get(pk=self.profile.id).avatar_hash, '')
+        job = Job.manager.claim('test')
+        self.assertEqual((job.task, job.args), ('askme_app.avatars.process', [self.profile.id]))
+        self.assertTrue(jobs.execute(job))
+        self.assertNotEqual(Profile.manager.get(pk=self.profile.id).avatar_hash, '')
+
+
+class PrecompressedStaticTest(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(STATIC_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.source = b'function like() {}\n' * 100
+        storage = FileSystemStorage(location=root.name)
+        storage.save('js/likes.0123456789ab.js', ContentFile(self.source))
+        storage.save('js/likes.0123456789ab.js.gz', ContentFile(gzip.compress(self.source)))
+        storage.save('js/likes.js', ContentFile(self.source))
+
+    def test_picks_variant_by_accept_encoding(self):
+        response = self.client.get('/static/js/likes.0123456789ab.js', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.source)
+
+        response = self.client.get('/static/js/likes.0123456789ab.js')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), self.source)
+
+    def test_unhashed_and_missing_files(self):
+        self.assertNotIn('immutable', self.client.get('/static/js/likes.js')['Cache-Control'])
+        self.assertEqual(self.client.get('/static/js/missing.js').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+
+@override_settings(THROTTLE_BUCKETS={'ip': (3, 1), 'username': (2, 0.1)}, CACHES=TEST_CACHES)
+class ThrottleTest(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+
+    def test_bucket_refills(self):
+        identities = [('ip', '10.0.0.1')]
+        self.assertEqual([throttle.take('login', identities, now=100) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(throttle.take('login', identities, now=100), 1)
+        self.assertAlmostEqual(throttle.take('login', identities, now=100.5), 0.5)
+        self.assertEqual(throttle.take('login', identities, now=101), 0)
+
+    def test_login_flood_gets_429(self):
+        url = reverse('login')
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            response = self.client.post(url, {'username': 'victim', 'password': 'guess'}, REMOTE_ADDR=ip)
+            self.assertEqual(response.status_code, 200)
+        # A new address does not help once the username's bucket is empty.
+        response = self.client.post(url, {'username': 'victim', 'password': 'guess'}, REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+
+    @override_settings(DEBUG=False, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+    def test_per_process_cache_is_refused(self):
+        # Every worker would have buckets of its own.
+        self.assertEqual([error.id for error in checks.check_shared_cache(None)], ['askme_app.E001'])
+
+
+class ProfileStatsTest(TestCase):
+    def setUp(self):
+        self.asker = Profile.manager.create(user=User.objects.create(username='asker'))
+        self.answerer = Profile.manager.create(user=User.objects.create(username='answerer'))
+
+    def test_write_paths_match_rebuild(self):
+        form = AskForm({'title': 'Question', 'content': 'Text', 'tags': 'tag0'}, author=self.asker)
+        self.assertTrue(form.is_valid())
+        question = form.save()
+        comment = Comment.manager.create_comment('Answer', self.answerer, question)
+        QuestionLike.objects.toggle_like(self.answerer, question)
+        CommentLike.objects.toggle_like(self.asker, comment)
+        CommentLike.objects.toggle_like(self.answerer, comment)
+        CommentLike.objects.toggle_like(self.answerer, comment)
+
+        incremental = list(ProfileStats.manager.order_by('pk').values())
+        ProfileStats.manager.rebuild()
+        self.assertEqual(list(ProfileStats.manager.order_by('pk').values()), incremental)
+        self.assertEqual(ProfileStats.manager.get(pk=self.answerer.pk).reputation,
+                         reputation(answers_count=1, likes_received=1))
+        self.assertEqual(list(Profile.manager.get_top_users(10)), [self.answerer, self.asker])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.user = User.objects.create_user(username='reader', password='secret')
+        self.profile = Profile.manager.create(user=self.user)
+        form = AskForm({'title': 'Question', 'content': 'Text', 'tags': 'tag0'}, author=self.profile)
+        self.assertTrue(form.is_valid())
+        self.question = form.save()
+        self.urls = [reverse('question', kwargs={'question_id': self.question.id}),
+                     reverse('tag', kwargs={'tag_name': 'tag0'})]
+
+    def test_not_modified_until_a_write(self):
+        # The question page checks its last_activity row; the tag page only the page cache version
+        # of the tag, so it has no Last-Modified.
+        for url, queries in zip(self.urls, [1, 0]):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                self.assertIn('Cookie', response['Vary'])
+                with self.assertNumQueries(queries):
+                    self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(self.urls[0])
+        self.assertEqual(self.client.get(self.urls[0], HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertNotIn('Last-Modified', self.client.get(self.urls[1]))
+
+        # An answer changes the question page and the row in the tag listing.
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        time.sleep(0.01)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.manager.create_comment('Answer', self.profile, self.question)
+        for url, etag in zip(self.urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sidebar_moves_validators_only_when_it_changes(self):
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        # Recomputed by another process, or after SIDEBAR_CACHE_TTL, with the same result.
+        sidebar.refresh()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Tag.manager.create(name='tag1')
+        sidebar.refresh()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_touch_does_not_write_tags(self):
+        with CaptureQueriesContext(connection) as queries:
+            Question.manager.touch(self.question.id)
+        writes = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('askme_app_question', writes[0])
+
+    def test_validators_depend_on_the_user(self):
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+FLAKY_CALLS = []
+
+
+@jobs.task(max_attempts=2)
+def flaky(fail):
+    FLAKY_CALLS.append(fail)
+    if fail:
+        raise ValueError('failed')
+
+
+@override_settings(JOB_RETRY_BASE=60)
+class JobQueueTest(TransactionTestCase):
+    def setUp(self):
+        FLAKY_CALLS.clear()
+
+    def test_retries_with_backoff_then_fails(self):
+        job = flaky.delay(True)
+        self.assertTrue(jobs.execute(Job.manager.claim('test')) is False)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater((job.run_at - job.started_at).total_seconds(), 40)
+        # Not due yet.
+        self.assertIsNone(Job.manager.claim('test'))
+
+        Job.manager.filter(pk=job.pk).update(run_at=job.started_at)
+        jobs.execute(Job.manager.claim('test'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('ValueError', job.last_error)
+
+    def test_stale_jobs_are_requeued_until_out_of_attempts(self):
+        job = flaky.delay(False)
+        lost = Job.manager.claim('dead')
+        Job.manager.filter(pk=job.pk).update(started_at=lost.started_at - timedelta(seconds=700))
+        self.assertEqual(Job.manager.requeue_stale(600), (1, 0))
+        # The old claim no longer owns the job once it is requeued.
+        self.assertEqual(Job.manager.finish(lost), 0)
+
+        second = Job.manager.claim('dead')
+        self.assertNotEqual(second.locked_by, lost.locked_by)
+        Job.manager.filter(pk=job.pk).update(started_at=second.started_at - timedelta(seconds=700))
+        self.assertEqual(Job.manager.requeue_stale(600), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNone(Job.manager.claim('test'))
+        self.assertEqual(FLAKY_CALLS, [])
+
+    def test_outcome_is_recorded_when_the_database_is_locked(self):
+        flaky.delay(False)
+        job = Job.manager.claim('test')
+        errors = [OperationalError('database table is locked')] * 2
+
+        def finish():
+            if errors:
+                raise errors.pop()
+            return Job.manager.finish(job)
+
+        self.assertEqual(jobs._record(finish), 1)
+        self.assertEqual(Job.manager.get(pk=job.pk).status, Job.DONE)
+
+    def test_worker_runs_each_job_once(self):
+        for i in range(20):
+            flaky.delay(False)
+        worker = jobs.Worker(concurrency=4, burst=True)
+        worker.run()
+        self.assertEqual((worker.processed, worker.failed, len(FLAKY_CALLS)), (20, 0, 20))
+        self.assertEqual(Job.manager.filter(status=Job.DONE).count(), 20)
+        stats = Job.manager.stats(300)
+        self.assertEqual((stats['counts'][Job.DONE], stats['finished']), (20, 20))
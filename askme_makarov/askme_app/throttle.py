@@ -0,0 +1,83 @@
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from askme_app import metrics
+
+# Token buckets in the 'shared' cache, which all worker processes use, one per client IP and one
+# per username. Every POST takes a token from each bucket it falls in, and buckets refill at a
+# steady rate up to their capacity. The read-then-write is not atomic: when processes race for the
+# last token, a burst overshoots by at most one request per worker, which is fine for a guard
+# against hashing floods.
+
+DEFAULT_BUCKETS = {
+    'ip': (20, 20 / 60),
+    'username': (5, 1 / 60),
+}
+
+
+def _buckets():
+    return getattr(settings, 'THROTTLE_BUCKETS', DEFAULT_BUCKETS)
+
+
+def _key(scope, kind, value):
+    digest = hashlib.md5(str(value).lower().encode()).hexdigest()
+    return f'throttle:{scope}:{kind}:{digest}'
+
+
+def take(scope, identities, now=None):
+    """
+    Takes a token from the bucket of every (kind, value) in identities. Returns 0 when all of them
+    had one, otherwise the seconds until they will (and takes nothing).
+    """
+    now = time.time() if now is None else now
+    buckets = _buckets()
+    keys = {_key(scope, kind, value): buckets[kind] for kind, value in identities if value}
+    cache = caches['shared']
+    states = cache.get_many(list(keys))
+
+    refilled, wait = {}, 0.0
+    for key, (capacity, rate) in keys.items():
+        tokens, updated = states.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens < 1:
+            wait = max(wait, (1 - tokens) / rate)
+        refilled[key] = tokens
+    if wait:
+        return wait
+
+    for key, (capacity, rate) in keys.items():
+        # Expires once it would be full again anyway.
+        cache.set(key, (refilled[key] - 1, now), math.ceil(capacity / rate))
+    return 0
+
+
+def throttle(scope, username=lambda request: request.POST.get('username')):
+    """
+    Answers POSTs over the limit of THROTTLE_BUCKETS with 429 Too Many Requests before the view
+    runs, so a flood of logins costs a cache lookup each instead of a password hash.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method == 'POST' and getattr(settings, 'THROTTLE_ENABLED', True):
+                identities = [('ip', request.META.get('REMOTE_ADDR')), ('username', username(request))]
+                wait = take(scope, identities)
+                if wait:
+                    metrics.throttled_total.inc((scope,))
+                    seconds = math.ceil(wait)
+                    response = HttpResponse(f"Too many attempts, try again in {seconds} seconds.",
+                                            content_type='text/plain', status=429)
+                    response['Retry-After'] = str(seconds)
+                    return response
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,55 +1,66 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings as django_settings
 from django.contrib import auth
-from django.contrib.auth import authenticate, login
+from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import ValidationError
+from django.db import connections
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseBadRequest, HttpResponseRedirect, HttpResponse
-from django.core.paginator import (Paginator, EmptyPage, PageNotAnInteger)
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, HttpResponse, JsonResponse, Http404, \
+    StreamingHttpResponse
 from django.urls import reverse
+from django.views.decorators.http import require_POST
 
+from askme_app import live, metrics as app_metrics, sidebar
+from askme_app.conditional import conditional_page
 from askme_app.forms import LoginForm, RegisterForm, SettingsForm, AskForm, CommentForm
-from askme_app.models import Question, Tag, Comment, Profile
-
-TOP_TAGS = Tag.manager.top_of_tags(10)
-TOP_USERS = Profile.manager.get_top_users(10)
-
+from askme_app.models import Question, Tag, Comment, Job, QuestionLike, CommentLike
+from askme_app.page_cache import anonymous_page_cache, LISTINGS, question_scope, tag_scope
+from askme_app.paginators import CursorPaginator, InvalidCursor
+from askme_app.tag_index import tag_index
+from askme_app.throttle import throttle
 
 def paginate(objects, request, per_page=20):
-    page = request.GET.get('page', 1)
-    paginator = Paginator(objects, per_page)
-    default_page = 1
+    cursor = request.GET.get('cursor')
+    paginator = CursorPaginator(objects, per_page)
     try:
-        items_page = paginator.page(page)
-    except PageNotAnInteger:
-        items_page = paginator.page(default_page)
-    except EmptyPage:
-        items_page = paginator.page(paginator.num_pages)
+        items_page = paginator.page(cursor)
+    except InvalidCursor:
+        items_page = paginator.page()
     return items_page
 
 
+@anonymous_page_cache(lambda: [LISTINGS])
 def index(request):
-    questions = Question.manager.get_new_questions()
+    questions = Question.manager.for_listing(Question.manager.get_new_questions())
     items_page = paginate(questions, request, 20)
-    return render(request, 'index.html', {'questions': items_page, 'pages': items_page, 'tags': TOP_TAGS, 'users': TOP_USERS})
+    return render(request, 'index.html', {'questions': items_page, 'pages': items_page})
 
 
+@conditional_page(Question.manager.get_last_activity)
+@anonymous_page_cache(lambda question_id: [question_scope(question_id)])
 def question(request, question_id):
-    item = get_object_or_404(Question, pk=question_id)
+    item = get_object_or_404(Question.manager.select_related('author'), pk=question_id)
     comments = Comment.manager.get_comments_ordered_by_likes(question_id)
     items_page = paginate(comments, request, 30)
     if request.method == 'GET':
         comment_form = CommentForm()
     if request.method == 'POST':
+        if not request.profile:
+            return redirect_to_login(request.get_full_path(), '/login/', 'continue')
         content = request.POST.get('content')
-        profile = Profile.manager.get_profile_by_id(request.user.id)
         question = Question.manager.get_question_by_id(question_id)
-        comment_form = CommentForm(request.POST, question=question, author=profile, initial={'content':content})
+        comment_form = CommentForm(request.POST, question=question, author=request.profile, initial={'content':content})
         if comment_form.is_valid():
             new_comment = comment_form.save()
             if new_comment:
                 return redirect('question', question_id=question_id)
     return render(request, 'question.html', {'question': item, 'comments': items_page,
-                                             'pages': items_page, 'question_id': question_id, 'tags': TOP_TAGS,'users': TOP_USERS, 'comment_form': comment_form})
+                                             'pages': items_page, 'question_id': question_id, 'comment_form': comment_form,
+                                             'live_updates': django_settings.LIVE_UPDATES_ENABLED})
 
 
 @login_required(login_url='/login/', redirect_field_name='continue')
@@ -58,15 +69,15 @@ def ask(request):
         ask_form = AskForm()
     if request.method == "POST":
         title, content, tags = request.POST['title'], request.POST['content'], request.POST['tags']
-        profile = Profile.manager.get_profile_by_id(request.user.id)
-        ask_form = AskForm(request.POST, author=profile, initial={"title": title, "content":content, "tags":tags})
+        ask_form = AskForm(request.POST, author=request.profile, initial={"title": title, "content":content, "tags":tags})
         if ask_form.is_valid():
             new_question = ask_form.save()
             if new_question:
                 return redirect('question', question_id=new_question.id)
-    return render(request, 'ask.html', {'tags': TOP_TAGS,'users': TOP_USERS, 'ask_form':ask_form, 'all_tags': Tag.manager.get_all_tag_names()})
+    return render(request, 'ask.html', {'ask_form':ask_form})
 
 
+@throttle('signup')
 def signup(request):
     if request.method == "GET":
         user_form = RegisterForm()
@@ -74,26 +85,25 @@ def signup(request):
         user_form = RegisterForm(request.POST, request.FILES)
         if user_form.is_valid():
             user = user_form.save()
-            new_user = authenticate(request, username=user_form.cleaned_data['username'], password=user_form.cleaned_data['password'])
             if user:
-                login(request, new_user)
+                # The password was just hashed by create_user; authenticate() would hash it again.
+                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
                 return redirect(reverse('index'))
             else:
                 user_form.add_error(None, "User saving error!")
-    return render(request, 'signup.html', {'tags': TOP_TAGS,'users': TOP_USERS, 'user_form': user_form})
+    return render(request, 'signup.html', {'user_form': user_form})
 
 
+@throttle('login')
 def log_in(request):
     if request.method == 'GET':
         login_form = LoginForm()
     if request.method == 'POST':
-        login_form = LoginForm(request.POST)
+        login_form = LoginForm(request.POST, request=request)
         if login_form.is_valid():
-            user = authenticate(request, **login_form.cleaned_data)
-            if user is not None:
-                login(request, user)
-                return redirect(request.GET.get('continue', 'index'))
-    return render(request, 'login.html', {'tags': TOP_TAGS, 'users': TOP_USERS, 'login_form': login_form})
+            login(request, login_form.get_user())
+            return redirect(request.GET.get('continue', 'index'))
+    return render(request, 'login.html', {'login_form': login_form})
 
 
 def log_out(request):
@@ -101,26 +111,157 @@ def log_out(request):
     return redirect(reverse('login'))
 
 
+@anonymous_page_cache(lambda: [LISTINGS])
 def hot(request):
-    items_page = paginate(Question.manager.get_top_questions(), request)
-    return render(request, 'hot.html', {'questions': items_page, 'pages': items_page, 'tags': TOP_TAGS,'users': TOP_USERS})
+    items_page = paginate(Question.manager.for_listing(Question.manager.get_top_questions()), request)
+    return render(request, 'hot.html', {'questions': items_page, 'pages': items_page})
 
 
 @login_required(login_url='/login/', redirect_field_name='continue')
+@throttle('settings', username=lambda request: request.user.username)
 def settings(request):
     if request.method == 'GET':
-        user_id = request.user.id
-        user, profile = Profile.manager.get_user_by_id(user_id), Profile.manager.get_profile_by_id(user_id)
-        settings_form = SettingsForm(initial={'username': user.username, 'email': user.email, 'avatar': profile.avatar})
+        user, profile = request.user, request.profile
+        settings_form = SettingsForm(initial={'username': user.username, 'email': user.email,
+                                              'avatar': profile.avatar if profile else None})
     if request.method == 'POST':
-        curr_username, email, avatar = request.user.username, request.POST['email'], request.POST['avatar']
-        settings_form = SettingsForm(request.POST, request=request, initial={'username': curr_username, 'email': email, 'avatar': avatar})
+        curr_username, email = request.user.username, request.POST.get('email', '')
+        settings_form = SettingsForm(request.POST, request.FILES, request=request,
+                                     initial={'username': curr_username, 'email': email})
         if settings_form.is_valid():
             settings_form.update()
-    return render(request, 'settings.html', {'tags': TOP_TAGS,'users': TOP_USERS, 'settings_form': settings_form})
+    return render(request, 'settings.html', {'settings_form': settings_form})
 
 
+@conditional_page(Tag.manager.get_listing_version)
+@anonymous_page_cache(lambda tag_name: [tag_scope(tag_name)])
 def tag(request, tag_name):
-    tag_item = Tag.manager.get_questions_by_tag(tag_name)
-    items_page = paginate(tag_item.order_by('-create_date'), request)
-    return render(request, 'tag.html', {'tag': tag_name, 'questions': items_page, 'pages': items_page, 'tags': TOP_TAGS,'users': TOP_USERS})
\ No newline at end of file
+    tag_item = Question.manager.for_listing(Tag.manager.get_questions_by_tag(tag_name))
+    items_page = paginate(tag_item, request)
+    return render(request, 'tag.html', {'tag': tag_name, 'questions': items_page, 'pages': items_page})
+
+
+@require_POST
+def like_question(request, question_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Log in to like questions'}, status=401)
+    question = get_object_or_404(Question.manager.only('id', 'author_id'), pk=question_id)
+    liked, likes_count = QuestionLike.objects.toggle_like(request.profile, question)
+    return JsonResponse({'liked': liked, 'likes_count': likes_count})
+
+
+@require_POST
+def like_comment(request, comment_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Log in to like answers'}, status=401)
+    comment = get_object_or_404(Comment.manager.only('id', 'author_id'), pk=comment_id)
+    liked, likes_count = CommentLike.objects.toggle_like(request.profile, comment)
+    return JsonResponse({'liked': liked, 'likes_count': likes_count})
+
+
+async def question_events(request, question_id):
+    # Served without a thread only under ASGI (see asgi.py); under WSGI every open stream holds a
+    # worker and is buffered to the end, hence off unless LIVE_UPDATES_ENABLED says it is ASGI.
+    if not django_settings.LIVE_UPDATES_ENABLED or not await Question.manager.filter(pk=question_id).aexists():
+        raise Http404
+    response = StreamingHttpResponse(live.event_stream(question_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def metrics(request):
+    allowed = request.META.get('REMOTE_ADDR') in django_settings.METRICS_ALLOWED_IPS or request.user.is_staff
+    if not allowed:
+        return HttpResponse(status=403)
+    jobs = Job.manager.stats(django_settings.JOB_METRICS_WINDOW)
+    extra = app_metrics.sample_lines('askme_jobs', 'Background jobs by status.', 'gauge', jobs['counts'], 'status')
+    extra += app_metrics.sample_lines('askme_job_oldest_due_seconds', 'How long the oldest due job has waited.',
+                                      'gauge', jobs['oldest_due_seconds'])
+    extra += app_metrics.sample_lines('askme_job_wait_seconds_avg', 'Average time from due to started of recent jobs.',
+                                      'gauge', jobs['wait_avg'])
+    extra += app_metrics.sample_lines('askme_job_wait_seconds_max', 'Longest time from due to started of recent jobs.',
+                                      'gauge', jobs['wait_max'])
+    extra += app_metrics.sample_lines('askme_job_run_seconds_avg', 'Average run time of recent jobs.',
+                                      'gauge', jobs['run_avg'])
+    return HttpResponse(app_metrics.render(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def search(request):
+    query = request.GET.get('q', '')
+    try:
+        items_page = Question.manager.search(query, request.GET.get('cursor'))
+    except InvalidCursor:
+        items_page = Question.manager.search(query)
+    return render(request, 'search.html', {'search_query': query, 'questions': items_page, 'pages': items_page})
+
+
+def tag_autocomplete(request):
+    return JsonResponse(tag_index.suggest(request.GET.get('term', '')), safe=False)
+
+
+# Async versions of the public read-only pages, used instead of the sync ones when ASYNC_READ_VIEWS
+# is on (see urls.py). Under ASGI they do not hold a thread while waiting for the database. Templates
+# touch request.user and the context processors, so rendering itself still runs in the sync thread.
+
+async def apaginate(objects, request, per_page=20):
+    cursor = request.GET.get('cursor')
+    paginator = CursorPaginator(objects, per_page)
+    try:
+        return await paginator.apage(cursor)
+    except InvalidCursor:
+        return await paginator.apage()
+
+
+def _load_leaderboard():
+    # Runs in its own executor thread, next to the listing query, so it gets (and closes) its own connection.
+    try:
+        return sidebar.get_leaderboard()
+    finally:
+        connections.close_all()
+
+
+async def with_leaderboard(listing):
+    items_page, _ = await asyncio.gather(listing, sync_to_async(_load_leaderboard, thread_sensitive=False)())
+    return items_page
+
+
+arender = sync_to_async(render)
+
+
+@anonymous_page_cache(lambda: [LISTINGS])
+async def index_async(request):
+    questions = Question.manager.for_listing(Question.manager.get_new_questions())
+    items_page = await with_leaderboard(apaginate(questions, request, 20))
+    return await arender(request, 'index.html', {'questions': items_page, 'pages': items_page})
+
+
+@anonymous_page_cache(lambda: [LISTINGS])
+async def hot_async(request):
+    questions = Question.manager.for_listing(Question.manager.get_top_questions())
+    items_page = await with_leaderboard(apaginate(questions, request))
+    return await arender(request, 'hot.html', {'questions': items_page, 'pages': items_page})
+
+
+@conditional_page(Tag.manager.get_listing_version)
+@anonymous_page_cache(lambda tag_name: [tag_scope(tag_name)])
+async def tag_async(request, tag_name):
+    questions = Question.manager.for_listing(await Tag.manager.aget_questions_by_tag(tag_name))
+    items_page = await with_leaderboard(apaginate(questions, request))
+    return await arender(request, 'tag.html', {'tag': tag_name, 'questions': items_page, 'pages': items_page})
+
+
+@conditional_page(Question.manager.get_last_activity)
+@anonymous_page_cache(lambda question_id: [question_scope(question_id)])
+async def question_async(request, question_id):
+    if request.method != 'GET':
+        return await sync_to_async(question)(request, question_id)
+    try:
+        item = await Question.manager.select_related('author').aget(pk=question_id)
+    except Question.DoesNotExist:
+        raise Http404
+    comments = Comment.manager.get_comments_ordered_by_likes(question_id)
+    items_page = await with_leaderboard(apaginate(comments, request, 30))
+    return await arender(request, 'question.html', {'question': item, 'comments': items_page, 'pages': items_page,
+                                                    'question_id': question_id, 'comment_form': CommentForm(),
+                                                    'live_updates': django_settings.LIVE_UPDATES_ENABLED})
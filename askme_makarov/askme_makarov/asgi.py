@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Live question updates (/question/<id>/events) need it, with LIVE_UPDATES_ENABLED = True, e.g.:
+    uvicorn askme_makarov.asgi:application
 """
 
 import os
@@ -43,11 +43,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'askme_app.middleware.PrecompressedStaticMiddleware',
+    'askme_app.middleware.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'askme_app.db_routers.PinToPrimaryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'askme_app.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,6 +71,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'askme_app.context_processors.leaderboard',
             ],
         },
     },
@@ -82,7 +87,12 @@ WSGI_APPLICATION = 'askme_makarov.wsgi.application'
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
 #         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
+#     },
+#     'replica': {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': BASE_DIR / 'replica.sqlite3',  # a copy of db.sqlite3, refreshed by hand
+#         'TEST': {'MIRROR': 'default'},
+#     },
 # }
 
 DATABASES = {
@@ -93,9 +103,96 @@ DATABASES = {
         'PASSWORD': '9185155',
         'HOST': 'localhost',
         'PORT': '5432',
-    }
+    },
+    # Streaming replica of default for the read queries. Until one is set up it is a second
+    # connection to the primary; point HOST/PORT at the standby to move the listings there.
+    'replica': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': 'askme',
+        'USER': 'deadbread',
+        'PASSWORD': '9185155',
+        'HOST': 'localhost',
+        'PORT': '5432',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['askme_app.db_routers.PrimaryReplicaRouter']
+
+# Aliases the router spreads reads over, and how long a client that wrote keeps reading from
+# default so that it sees its own answer or like before the replicas catch up
+REPLICA_DATABASES = ['replica']
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    # Kept by every process for itself: sessions and rendered fragments and pages, which only have to
+    # be fresh enough
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # State all worker processes have to agree on: the throttle's token buckets, the versions that
+    # invalidate cached pages and the sidebar leaderboard. A directory is shared by the processes of
+    # one host; across hosts use django.core.cache.backends.redis.RedisCache or the database cache
+    # instead. A LocMemCache here fails the askme_app.E001 check
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
+# Sessions are read from the cache and only looked up in the database on a miss, so a logged in
+# request does not query the session table
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Seconds the "Popular tags" / "Best members" sidebar is served before it is recomputed
+SIDEBAR_CACHE_TTL = 60
+
+# Seconds before the in-process tag autocomplete index is reloaded to see tags added by other workers
+TAG_INDEX_TTL = 300
+# Prefixes whose suggestions are memoized, least recently asked dropped first
+TAG_INDEX_MEMO_SIZE = 1000
+
+# Upper bound in seconds for anonymous full-page cache entries; writes invalidate them earlier
+PAGE_CACHE_TIMEOUT = 600
+
+# Upper bound in seconds for rendered question/comment items; they are keyed by their counters,
+# so a like or an answer switches to a new key instead of invalidating anything
+FRAGMENT_CACHE_ENABLED = True
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Live answer/like updates on question pages (askme_app/live.py). Only turn on when served by ASGI
+# (asgi.py): under WSGI or runserver every open page holds a worker for LIVE_STREAM_MAX_AGE seconds
+# and receives nothing, the stream being buffered. The in-process broker only reaches clients
+# connected to the same process; a shared broker is needed to run several ASGI workers.
+LIVE_UPDATES_ENABLED = False
+LIVE_BROKER = 'askme_app.live.InProcessBroker'
+LIVE_QUEUE_SIZE = 100
+LIVE_HEARTBEAT = 15
+LIVE_STREAM_MAX_AGE = 300
+
+# Serve index, hot, tag and question with their async views. Only worth it under ASGI (asgi.py):
+# under WSGI every async view is run in a new event loop of its own.
+ASYNC_READ_VIEWS = False
+
+# SQL statements repeated more than this many times in one request are logged as N+1 candidates
+SQL_DUPLICATE_THRESHOLD = 2
+
+# Clients allowed to read /metrics besides logged in staff users
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Token buckets (capacity, tokens per second) for the POSTs to login, signup and settings, which
+# hash a password: per client IP, and per username against credential stuffing. Behind a reverse
+# proxy REMOTE_ADDR has to be the client's address, not the proxy's.
+THROTTLE_ENABLED = True
+THROTTLE_BUCKETS = {
+    'ip': (20, 20 / 60),
+    'username': (5, 1 / 60),
+}
 
 
 # Password validation
@@ -142,3 +239,33 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 STATICFILES_DIRS = [
     BASE_DIR / 'static'
 ]
+
+# "manage.py build_static" collects here: minified, with content hashes in the names and with
+# .gz/.br copies. Until it has been run the templates link the plain files of STATICFILES_DIRS.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'askme_app.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# User uploads. Avatar thumbnails are named after their content, so the web server can serve
+# MEDIA_URL/avatars/ with "Cache-Control: public, max-age=31536000, immutable".
+MEDIA_ROOT = BASE_DIR / 'uploads'
+MEDIA_URL = 'uploads/'
+
+# Background jobs (askme_app/jobs.py), run by "manage.py run_worker". Idle workers poll the jobs
+# table every JOB_POLL_INTERVAL seconds; a failed job is retried after JOB_RETRY_BASE seconds,
+# doubling up to JOB_RETRY_MAX. Jobs running longer than JOB_TIMEOUT are taken to belong to a dead
+# worker and queued again. Finished jobs are kept JOB_RETENTION seconds, and /metrics reports the
+# wait and run times of those finished in the last JOB_METRICS_WINDOW seconds.
+JOB_POLL_INTERVAL = 1
+JOB_RETRY_BASE = 5
+JOB_RETRY_MAX = 3600
+JOB_TIMEOUT = 600
+JOB_RETENTION = 86400
+JOB_METRICS_WINDOW = 300
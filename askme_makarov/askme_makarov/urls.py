@@ -14,18 +14,32 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from askme_app import views
+
+
+def read_view(name):
+    return getattr(views, f'{name}_async' if settings.ASYNC_READ_VIEWS else name)
+
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', views.index, name='index'),
-    path('hot', views.hot, name='hot'),
+    path('', read_view('index'), name='index'),
+    path('hot', read_view('hot'), name='hot'),
     path('settings/', views.settings, name='settings'),
-    path('tag/<str:tag_name>', views.tag, name='tag'),
-    path('question/<int:question_id>', views.question, name='question'),
+    path('tag/<str:tag_name>', read_view('tag'), name='tag'),
+    path('search', views.search, name='search'),
+    path('tags/autocomplete', views.tag_autocomplete, name='tag_autocomplete'),
+    path('question/<int:question_id>', read_view('question'), name='question'),
+    path('question/<int:question_id>/events', views.question_events, name='question_events'),
+    path('question/<int:question_id>/like', views.like_question, name='like_question'),
+    path('comment/<int:comment_id>/like', views.like_comment, name='like_comment'),
     path('ask/', views.ask, name='ask'),
     path('signup/', views.signup, name='signup'),
     path('login/', views.log_in, name='login'),
     path('logout/', views.log_out, name='logout'),
-]
+    path('metrics', views.metrics, name='metrics'),
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
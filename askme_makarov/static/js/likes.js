@@ -0,0 +1,33 @@
+function getCookie(name) {
+    var match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+    return match ? decodeURIComponent(match[1]) : null;
+}
+
+document.addEventListener('click', function (event) {
+    var toggle = event.target.closest('.like-toggle');
+    if (!toggle) {
+        return;
+    }
+    var likes = toggle.closest('.likes');
+    fetch(likes.dataset.likeUrl, {
+        method: 'POST',
+        headers: {'X-CSRFToken': getCookie('csrftoken')},
+        credentials: 'same-origin'
+    })
+        .then(function (response) {
+            if (response.status === 401) {
+                window.location.href = '/login/?continue=' + encodeURIComponent(window.location.pathname);
+                return null;
+            }
+            return response.ok ? response.json() : null;
+        })
+        .then(function (data) {
+            if (!data) {
+                return;
+            }
+            var counter = likes.querySelector('.likes-count');
+            counter.textContent = data.likes_count;
+            counter.classList.toggle('text-success', data.likes_count > 0);
+            toggle.classList.toggle('text-success', data.liked);
+        });
+});
@@ -0,0 +1,30 @@
+(function () {
+    var answers = document.querySelector('.answers[data-events-url]');
+    if (!answers || !window.EventSource) {
+        return;
+    }
+    var source = new EventSource(answers.dataset.eventsUrl);
+
+    source.addEventListener('answer', function (event) {
+        var data = JSON.parse(event.data);
+        // Answers are ordered by likes, so a new one (0 likes) belongs on the last page only.
+        if (answers.dataset.append !== 'true') {
+            return;
+        }
+        if (answers.querySelector('[data-like-url="' + data.url + '"]')) {
+            return;
+        }
+        answers.insertAdjacentHTML('beforeend', data.html);
+    });
+
+    source.addEventListener('likes', function (event) {
+        var data = JSON.parse(event.data);
+        var likes = document.querySelector('.likes[data-like-url="' + data.url + '"]');
+        if (!likes) {
+            return;
+        }
+        var counter = likes.querySelector('.likes-count');
+        counter.textContent = data.likes_count;
+        counter.classList.toggle('text-success', data.likes_count > 0);
+    });
+})();